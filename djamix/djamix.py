@@ -4,42 +4,86 @@
 This is main djamix file.
 """
 
-from collections import defaultdict, OrderedDict
-from functools import cmp_to_key, partial
-from operator import attrgetter as A
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import ChainMap, defaultdict, OrderedDict
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from operator import attrgetter as A, itemgetter
+from types import CodeType, SimpleNamespace
 from urllib.parse import urlencode
-from uuid import NAMESPACE_URL, uuid4, uuid5
+from uuid import NAMESPACE_URL, UUID, uuid4, uuid5
 import csv
 import code
 import datetime
+import hashlib
+import heapq
 import inspect
 import itertools
 import json
+import mmap
+import multiprocessing
 import os
 import operator
+import pickle
 import random
 import shutil
 import sys
+import threading
+import time
 
 import django
 from django.conf import settings
 from django.conf.urls.static import static
 from django.core.management import execute_from_command_line
 from django.core.serializers.json import DjangoJSONEncoder
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseNotModified
 import django.template
-from django.template import Library
+from django.template import Library, RequestContext
 from django.template.loader import render_to_string
 from django.template.response import TemplateResponse
 from django.template.defaultfilters import slugify
 from django.urls import path, reverse, clear_url_caches
 from django.utils import autoreload
 from django.utils.functional import empty
-from django.utils.lorem_ipsum import words
+from django.utils.http import parse_etags
+from django.utils.lorem_ipsum import WORDS
 
 import yaml
 from faker import Faker
 
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# use libyaml based loaders when pyyaml was built with it
+SafeYAMLLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+if getattr(yaml, '__with_libyaml__', False):
+    class StreamingYAMLLoader(yaml.cyaml.CParser,
+                              yaml.composer.Composer,
+                              yaml.constructor.SafeConstructor,
+                              yaml.resolver.Resolver):
+        """
+        libyaml parses the events, but nodes are composed in python, so we
+        can compose and construct one list item at a time.
+        """
+
+        def __init__(self, stream):
+            yaml.cyaml.CParser.__init__(self, stream)
+            yaml.composer.Composer.__init__(self)
+            yaml.constructor.SafeConstructor.__init__(self)
+            yaml.resolver.Resolver.__init__(self)
+else:  # pragma: no cover
+    StreamingYAMLLoader = yaml.SafeLoader
+
 fake = Faker()
 register = Library()
 
@@ -55,6 +99,42 @@ MEDIA_ROOT = "media/"
 
 DEBUG = False
 
+# When enabled, parsed and converted fixture records are cached next to the
+# fixture (in <fixture>.djamixcache) and reused while the fixture doesn't
+# change. Can be changed per model with Meta.cache.
+FIXTURE_CACHE = False
+FIXTURE_CACHE_SUFFIX = '.djamixcache'
+FIXTURE_CACHE_VERSION = 2
+# records pickled together in the cache
+FIXTURE_CACHE_CHUNK = 1000
+# Meta.storage = 'mmap' keeps columns in <fixture>.djamixstore
+FIXTURE_STORE_SUFFIX = '.djamixstore'
+# When set, fixtures aren't loaded when models are defined, but parsed by
+# this many processes in start() (or when a model is used before that).
+FIXTURE_WORKERS = None
+
+# Models with Meta.lazy (default below) load their fixtures only when they're
+# used for the first time, eg. on first access to Model.objects
+LAZY_FIXTURES = False
+
+# model -> class body of models waiting for their fixtures
+pending_models = OrderedDict()
+# pending models whose fixtures are being loaded right now
+loading_models = set()
+
+# limits of responses kept by each view with `cache: <seconds>` in urls
+VIEW_CACHE_ENTRIES = 256
+VIEW_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+# bumped whenever records of a model change (also when they're edited in
+# place), cached responses from before are not used anymore
+data_version = 0
+
+
+def records_changed():
+    global data_version
+    data_version += 1
+
 
 class DjamixException(Exception):
     pass
@@ -110,6 +190,79 @@ class DjamixJSONEncoder(DjangoJSONEncoder):
 # Data part
 # ---------
 
+def iter_yaml_records(stream, name='fixture', Loader=StreamingYAMLLoader):
+    """
+    Yields items of a YAML document with a list of records one at a time.
+
+    Uses yaml events and composes/constructs each item separately, so the
+    whole document never has to be in memory at once.
+    """
+    loader = Loader(stream)
+    try:
+        loader.get_event()  # StreamStartEvent
+        if loader.check_event(yaml.StreamEndEvent):
+            return
+
+        loader.get_event()  # DocumentStartEvent
+        if not loader.check_event(yaml.SequenceStartEvent):
+            node = loader.compose_node(None, None)
+            document = loader.construct_document(node)
+            if document:
+                raise FixtureError(f"{name} should be a list of records")
+            return
+
+        loader.get_event()  # SequenceStartEvent
+        while not loader.check_event(yaml.SequenceEndEvent):
+            node = loader.compose_node(None, None)
+            yield loader.construct_document(node)
+    finally:
+        loader.dispose()
+
+
+def json_loads(data):
+    """
+    orjson if it's installed, json otherwise
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def iter_json_records(stream, name='fixture'):
+    """
+    Yields records of a JSON document with a list of records
+    """
+    try:
+        document = json_loads(stream.read())
+    except ValueError as e:
+        raise FixtureError(f"{name} is not valid JSON: {e}")
+
+    if not isinstance(document, list):
+        raise FixtureError(f"{name} should be a list of records")
+
+    yield from document
+
+
+def iter_json_lines_records(stream, name='fixture'):
+    """
+    Yields records of a JSON Lines file, parsing one line at a time.
+    Empty lines are skipped.
+    """
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+
+        try:
+            record = json_loads(line)
+        except ValueError as e:
+            raise FixtureError(f"{name}:{line_number} is not valid JSON: {e}")
+
+        if not isinstance(record, dict):
+            raise FixtureError(f"{name}:{line_number} should be a record")
+
+        yield record
+
+
 class Field:
     """
     Allows for easier marking of field types. Doesn't do much itself except for
@@ -169,6 +322,7 @@ class FK:
         }
 
 
+@lru_cache(maxsize=None)
 def make_accessible_name(name):
     """
     The goal here is to take a random name, like "Meetup ID", and turn it into
@@ -180,31 +334,92 @@ def make_accessible_name(name):
     return slugify(name).replace('-', '_')
 
 
+def sort_columns(columns):
+    """
+    Turns ordering like ['name', '-date'] into [(getter, descending), ...]
+    """
+    return [
+        (A(c.strip()[1:].strip()), True) if c.strip().startswith('-')
+        else (A(c.strip()), False)
+        for c in columns
+    ]
+
+
+def sort_value(getter, item):
+    value = getter(item)
+    if callable(value):
+        return value()
+    return value
+
+
+class Descending:
+    """
+    Inverts comparisons of a wrapped value, so it can be used in a single key
+    tuple together with ascending values (strings or dates can't be negated)
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
 def multi_attr_sort(items, columns):
-    # copied and adapted from
-    # https://stackoverflow.com/questions/1143671/
-    # /python-sorting-list-of-dictionaries-by-multiple-keys
-
-    def cmp(a, b):
-        if callable(a):
-            a = a()
-        if callable(b):
-            b = b()
-        return (a > b) - (a < b)
-
-    comparers = [(
-        (A(c[1:].strip()), -1) if c.startswith('-') else (A(c.strip()), 1)
-    ) for c in columns]
-
-    def comparer(left, right):
-        for fn, mult in comparers:
-            result = cmp(fn(left), fn(right))
-            if result:
-                return mult * result
-        else:
-            return 0
+    """
+    Stable sort by multiple attributes, "-name" sorts descending.
 
-    return sorted(items, key=cmp_to_key(comparer))
+    Every record's keys are computed once (calling model methods if needed)
+    and then sorted column by column starting from the last one. That way
+    descending columns work for values that can't be negated, like strings
+    or dates.
+    """
+    getters = sort_columns(columns)
+
+    decorated = [
+        tuple(sort_value(getter, item) for getter, _ in getters) + (item,)
+        for item in items
+    ]
+
+    directions = {descending for _, descending in getters}
+    if len(directions) == 1:
+        decorated.sort(key=itemgetter(slice(0, len(getters))),
+                       reverse=directions.pop())
+    else:
+        for i, (_, descending) in reversed(list(enumerate(getters))):
+            decorated.sort(key=itemgetter(i), reverse=descending)
+
+    return [d[-1] for d in decorated]
+
+
+def multi_attr_top(items, columns, n):
+    """
+    Same as multi_attr_sort(items, columns)[:n] but uses a heap, so it's
+    O(len(items) * log(n)) instead of a full sort.
+    """
+    getters = sort_columns(columns)
+    directions = {descending for _, descending in getters}
+
+    if len(directions) == 1:
+        def key(item):
+            return tuple(sort_value(getter, item) for getter, _ in getters)
+
+        if directions.pop():
+            return heapq.nlargest(n, items, key=key)
+        return heapq.nsmallest(n, items, key=key)
+
+    def key(item):
+        return tuple(
+            Descending(sort_value(getter, item)) if descending
+            else sort_value(getter, item)
+            for getter, descending in getters
+        )
+
+    return heapq.nsmallest(n, items, key=key)
 
 
 def filter_including_callables(obj, key, value, operation=operator.eq):
@@ -222,6 +437,7 @@ FILTER_FUNCTIONS = {
     'iendswith':   lambda x, y: x.lower().endswith(y.lower()),
     'exact':       lambda x, y: x == y,
     'iexact':      lambda x, y: x.lower() == y.lower(),
+    'in':          lambda x, y: x in y,
     'contains':    lambda x, y: y in x,
     'icontains':   lambda x, y: y.lower() in x.lower(),
 
@@ -244,11 +460,494 @@ FILTER_FUNCTIONS = {
 }
 
 
+class Q:
+    """
+    Encapsulates lookups so they can be combined with & (and), | (or) and
+    ~ (not), just like django's Q objects.
+
+        Country.objects.filter(Q(iso='pl') | ~Q(continent='Europe'))
+    """
+    AND = 'AND'
+    OR = 'OR'
+
+    def __init__(self, *children, **kwargs):
+        self.children = list(children) + sorted(kwargs.items())
+        self.connector = self.AND
+        self.negated = False
+
+    @classmethod
+    def _new(cls, children, connector=AND, negated=False):
+        q = cls()
+        q.children = list(children)
+        q.connector = connector
+        q.negated = negated
+        return q
+
+    def __and__(self, other):
+        return self._new([self, other], self.AND)
+
+    def __or__(self, other):
+        return self._new([self, other], self.OR)
+
+    def __invert__(self):
+        return self._new([self], negated=True)
+
+    def __repr__(self):
+        return '<Q: %s%s %s>' % (
+            'NOT ' if self.negated else '', self.connector, self.children
+        )
+
+
+# internal lookup type for filtering by fields of related (FK) models
+RELATED_LOOKUP = 'related'
+
+# order in which compiled lookups are checked, cheapest and most selective
+# first, so the predicate can short-circuit early
+LOOKUP_SELECTIVITY = {
+    None: 0, 'exact': 0, 'in': 1, 'iexact': 1, RELATED_LOOKUP: 1,
+    'range': 2, 'year': 2, 'month': 3,
+    'gt': 3, 'gte': 3, 'lt': 3, 'lte': 3,
+    'startswith': 4, 'istartswith': 4, 'endswith': 4, 'iendswith': 4,
+    'contains': 5, 'icontains': 5,
+    'bool': 6, 'isnull': 6, 'isnotnull': 6,
+}
+# lookups added to FILTER_FUNCTIONS by projects
+DEFAULT_SELECTIVITY = 7
+
+
+@lru_cache(maxsize=1024)
+def compile_lookup(model_class, field, lookup, plain_value):
+    """
+    Returns a factory that for a given value creates a single-argument test
+    for a record, eg. compile_lookup(Country, 'name', None, True)('Poland').
+
+    plain_value means the schema says it's a data field, so there is no need
+    to check if the value should be called (like a model method).
+    Cached, because the same lookups are used over and over again.
+    """
+    if lookup == RELATED_LOOKUP:
+        def make_test(pks):
+            def test(record):
+                target = getattr(record, field, None)
+                return target is not None and target.pk in pks
+            return test
+        return make_test
+
+    operation = FILTER_FUNCTIONS[lookup] if lookup else operator.eq
+
+    if not plain_value:
+        def make_test(value):
+            def test(record):
+                thing = getattr(record, field, None)
+                if callable(thing):
+                    thing = thing()
+                return operation(thing, value)
+            return test
+
+    elif lookup in [None, 'exact']:
+        def make_test(value):
+            return lambda record: getattr(record, field, None) == value
+
+    elif lookup == 'in':
+        def make_test(values):
+            return lambda record: getattr(record, field, None) in values
+
+    elif lookup in ['gt', 'gte', 'lt', 'lte']:
+        compare = {
+            'gt': operator.gt, 'gte': operator.ge,
+            'lt': operator.lt, 'lte': operator.le,
+        }[lookup]
+
+        def make_test(value):
+            return lambda record: compare(getattr(record, field, None), value)
+
+    elif lookup == 'range':
+        def make_test(value):
+            low, high = value
+            return lambda record: low <= getattr(record, field, None) <= high
+
+    else:
+        def make_test(value):
+            return lambda record: operation(getattr(record, field, None),
+                                            value)
+
+    return make_test
+
+
+def compile_lookups(model_class, lookups):
+    """
+    Turns a list of (field, lookup, value) and Q nodes into a single
+    predicate, that's true if all of them match.
+    """
+    schema = model_class._schema
+
+    def selectivity(lookup):
+        if isinstance(lookup, Q):
+            return 100
+        field, name, _ = lookup
+        return LOOKUP_SELECTIVITY.get(name, DEFAULT_SELECTIVITY) + \
+            (0 if field in schema else 10)
+
+    tests = [
+        compile_q(model_class, lookup) if isinstance(lookup, Q)
+        else compile_lookup(
+            model_class, lookup[0], lookup[1], lookup[0] in schema
+        )(lookup[2])
+        for lookup in sorted(lookups, key=selectivity)
+    ]
+
+    if not tests:
+        return lambda record: True
+
+    if len(tests) == 1:
+        return tests[0]
+
+    if len(tests) == 2:
+        first, second = tests
+        return lambda record: first(record) and second(record)
+
+    def predicate(record):
+        for test in tests:
+            if not test(record):
+                return False
+        return True
+
+    return predicate
+
+
+def compile_q(model_class, q):
+    """
+    Same as compile_lookups, but for a (parsed) Q node
+    """
+    if q.connector == Q.AND:
+        test = compile_lookups(model_class, q.children)
+    else:
+        tests = [compile_lookups(model_class, [c]) for c in q.children]
+
+        def test(record):
+            for t in tests:
+                if t(record):
+                    return True
+            return False
+
+    if q.negated:
+        return lambda record: not test(record)
+    return test
+
+
+# lookups that can be answered by a sorted (range) index
+RANGE_LOOKUPS = {'gt', 'gte', 'lt', 'lte', 'range', 'year'}
+
+# marks a field which can't be indexed (unhashable, unorderable or callable
+# values)
+UNINDEXABLE = object()
+
+# field types and lookups that can be evaluated with numpy (if installed)
+NUMPY_TYPES = {
+    int: 'int64',
+    float: 'float64',
+    datetime.date: 'datetime64[D]',
+}
+NUMPY_LOOKUPS = {
+    None, 'exact', 'in', 'gt', 'gte', 'lt', 'lte', 'range', 'year', 'month',
+}
+
+
+def numpy_mask(column, lookup, value):
+    """
+    Boolean mask of numpy column values matching the lookup, or None if it
+    can't be done with numpy (eg. value of a different type).
+    """
+    is_date = column.dtype.kind == 'M'
+
+    def convert(v):
+        if is_date:
+            if type(v) != datetime.date:  # NOQA
+                raise TypeError("Not a date %r" % v)
+            return numpy.datetime64(v, 'D')
+        if not isinstance(v, (int, float)):
+            raise TypeError("Not a number %r" % v)
+        return v
+
+    try:
+        if lookup in [None, 'exact']:
+            return column == convert(value)
+        if lookup == 'in':
+            return numpy.isin(column, [convert(v) for v in value])
+        if lookup == 'gt':
+            return column > convert(value)
+        if lookup == 'gte':
+            return column >= convert(value)
+        if lookup == 'lt':
+            return column < convert(value)
+        if lookup == 'lte':
+            return column <= convert(value)
+        if lookup == 'range':
+            return (column >= convert(value[0])) & \
+                (column <= convert(value[1]))
+        if lookup in ['year', 'month'] and is_date:
+            if not isinstance(value, int):
+                return None
+            if lookup == 'year':
+                years = column.astype('datetime64[Y]').astype('int64') + 1970
+                return years == value
+            months = column.astype('datetime64[M]').astype('int64') % 12 + 1
+            return months == value
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+    return None
+
+
+def numpy_sum(values):
+    """
+    Sum of numpy values as a python number, or None if int64 could overflow
+    """
+    if values.dtype.kind == 'f':
+        return values.sum().item()
+
+    if values.dtype.kind == 'i':
+        if not len(values):
+            return 0
+        biggest = max(abs(values.min().item()), abs(values.max().item()))
+        if biggest * len(values) < 2 ** 63:
+            return values.sum().item()
+
+    return None
+
+
+def resolve_value(obj, key):
+    """
+    Attribute value, calling it first if it's a method
+    """
+    thing = getattr(obj, key, None)
+    if callable(thing):
+        return thing()
+    return thing
+
+
+class Aggregate:
+    """
+    Base for aggregates used in .aggregate() and .values().annotate().
+
+    Each aggregate keeps a small state that is updated with step() for every
+    record, so any number of them can be computed in a single pass. Just
+    like in django None values are skipped.
+    """
+    name = None
+
+    def __init__(self, field):
+        self.field = field
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.field)
+
+    @property
+    def default_alias(self):
+        return '%s__%s' % (self.field, self.name.lower())
+
+    def start(self):
+        return None
+
+    def step(self, state, value):
+        raise NotImplementedError
+
+    def finish(self, state):
+        return state
+
+
+class Sum(Aggregate):
+    name = 'Sum'
+
+    def step(self, state, value):
+        return value if state is None else state + value
+
+
+class Count(Aggregate):
+    name = 'Count'
+
+    def start(self):
+        return 0
+
+    def step(self, state, value):
+        return state + 1
+
+
+class Avg(Aggregate):
+    name = 'Avg'
+
+    def start(self):
+        return (0, 0)
+
+    def step(self, state, value):
+        return (state[0] + value, state[1] + 1)
+
+    def finish(self, state):
+        total, count = state
+        return total / count if count else None
+
+
+class Min(Aggregate):
+    name = 'Min'
+
+    def step(self, state, value):
+        return value if state is None or value < state else state
+
+
+class Max(Aggregate):
+    name = 'Max'
+
+    def step(self, state, value):
+        return value if state is None or value > state else state
+
+
+def aggregate_records(records, aggregates, group_by=None):
+    """
+    Computes {alias: Aggregate} over records in one pass.
+
+    With group_by (list of fields) returns a list of dicts – one per distinct
+    combination of values (in first seen order), with the group_by values
+    and aggregates.
+    """
+    aggregates = list(aggregates.items())
+    groups = {}
+
+    for record in records:
+        if group_by:
+            key = tuple(resolve_value(record, f) for f in group_by)
+        else:
+            key = ()
+
+        states = groups.get(key)
+        if states is None:
+            states = groups[key] = [agg.start() for _, agg in aggregates]
+
+        for i, (_, agg) in enumerate(aggregates):
+            value = resolve_value(record, agg.field)
+            if value is not None:
+                states[i] = agg.step(states[i], value)
+
+    def finish(states):
+        return {
+            alias: agg.finish(state)
+            for (alias, agg), state in zip(aggregates, states)
+        }
+
+    if not group_by:
+        return finish(groups.get((), [agg.start() for _, agg in aggregates]))
+
+    output = []
+    for key, states in groups.items():
+        row = dict(zip(group_by, key))
+        row.update(finish(states))
+        output.append(row)
+    return output
+
+
+def named_aggregates(args, kwargs):
+    aggregates = OrderedDict((agg.default_alias, agg) for agg in args)
+    aggregates.update(kwargs)
+    return aggregates
+
+
+# rows generated by one process (and from one seed) in DjamixManager.fake
+FAKE_CHUNK_SIZE = 10000
+# fixed (not up to today), so the same seed gives the same dates every day
+FAKE_DATES = (datetime.date(1970, 1, 1), datetime.date(2029, 12, 31))
+
+
+def fake_column(field_type, field_name, count, rng, faker):
+    """
+    count fake values of a field. rng is a numpy Generator (if numpy is
+    installed) or random.Random.
+    """
+    if isinstance(field_type, Field):
+        field_type = field_type.type
+
+    vectorised = numpy is not None and isinstance(rng, numpy.random.Generator)
+
+    if field_type == int:
+        if vectorised:
+            return rng.integers(0, 10000, count).tolist()
+        return [rng.randint(0, 9999) for _ in range(count)]
+    elif field_type == float:
+        if vectorised:
+            return rng.uniform(-10000, 10000, count).tolist()
+        return [rng.uniform(-10000, 10000) for _ in range(count)]
+    elif field_type == bool:
+        if vectorised:
+            return rng.integers(0, 2, count).astype(bool).tolist()
+        return [rng.random() < 0.5 for _ in range(count)]
+    elif field_type == datetime.date:
+        start, end = (d.toordinal() for d in FAKE_DATES)
+        if vectorised:
+            ordinals = rng.integers(start, end + 1, count).tolist()
+        else:
+            ordinals = [rng.randint(start, end) for _ in range(count)]
+        return [datetime.date.fromordinal(o) for o in ordinals]
+    elif field_type == UUID:
+        python_rng = random.Random(int(rng.integers(2 ** 32))) if vectorised \
+            else rng
+        return [str(UUID(int=python_rng.getrandbits(128), version=4))
+                for _ in range(count)]
+    elif field_type == str:
+        custom_faker = getattr(faker, field_name, None)
+        if custom_faker:
+            return [custom_faker() for _ in range(count)]
+        python_rng = random.Random(int(rng.integers(2 ** 32))) if vectorised \
+            else rng
+        return [' '.join(python_rng.sample(WORDS, 3)) for _ in range(count)]
+    else:
+        raise ValueError("UNKOWN TYPE!", field_type)
+
+
+def fake_columns(fields, count, seed, locales):
+    """
+    {field name: list of count fake values} for (name, type) fields, always
+    the same for the same seed (a tuple of ints).
+    """
+    faker = Faker(locales)
+    faker.seed_instance(str(seed))
+    if numpy is not None:
+        rng = numpy.random.default_rng(list(seed))
+    else:  # pragma: no cover
+        rng = random.Random(str(seed))
+
+    return {
+        field_name: fake_column(field_type, field_name, count, rng, faker)
+        for field_name, field_type in fields
+    }
+
+
 class DjamixManager:
+    """
+    Managers created by filter() and order_by() are lazy – they only keep the
+    lookups and ordering, and get evaluated in one pass over the closest
+    concrete manager (with its indexes) when iterated, indexed or len()'d.
+    """
 
-    def __init__(self, records, model_class, ordering=None, previous=None):
+    def __init__(self, records, model_class, ordering=None, previous=None,
+                 lookups=()):
         self.previous = previous
         self.model_class = model_class
+        self._indexes = {}
+        self._range_indexes = {}
+        self._sort_cache = {}
+        self._groupby_cache = {}
+        self._numpy_columns = {}
+        self._record_version = getattr(model_class, '_record_version', 0)
+        self._lookups = tuple(lookups)
+        self._positions_cache = None
+        self._filtered_cache = None
+
+        if records is None:
+            # lazy manager
+            self._source = previous._source
+            self.ordering = ordering
+            self._result_cache = None
+            return
+
+        self._source = self
 
         if not ordering:
             self.ordering = getattr(model_class.Meta, 'ordering', None)
@@ -256,9 +955,28 @@ class DjamixManager:
             self.ordering = ordering
 
         if (not ordering) and self.ordering:
-            self._records = multi_attr_sort(records, self.ordering)
+            if isinstance(records, ColumnarRows):
+                self._result_cache = records.sorted(self.ordering)
+            else:
+                self._result_cache = multi_attr_sort(records, self.ordering)
         else:
-            self._records = records
+            self._result_cache = records
+
+        if previous is None:
+            for field in getattr(model_class.Meta, 'indexes', None) or []:
+                self._get_index(field)
+
+    @property
+    def _records(self):
+        if self._result_cache is None:
+            self._result_cache = self._evaluate()
+        return self._result_cache
+
+    @_records.setter
+    def _records(self, records):
+        self._result_cache = records
+        self._invalidate_caches()
+        records_changed()
 
     def _clone(self, new_records, **kwargs):
         return self.__class__(new_records,
@@ -266,60 +984,327 @@ class DjamixManager:
                               previous=self,
                               **kwargs)
 
+    def _chain(self, lookups=(), ordering=None):
+        return self.__class__(None,
+                              model_class=self.model_class,
+                              previous=self,
+                              ordering=ordering,
+                              lookups=self._lookups + tuple(lookups))
+
+    def _is_lazy(self):
+        return self._source is not self
+
+    def _filtered_positions(self):
+        """
+        Positions (in the source) of records matching all the lookups, None
+        means all of them
+        """
+        if not self._is_lazy() or not self._lookups:
+            return None
+
+        if self._positions_cache is None:
+            self._positions_cache = self._source._match_positions(
+                self._lookups
+            )
+        return self._positions_cache
+
+    def _filtered(self):
+        """
+        Records matching all the lookups, in the source order (not sorted)
+        """
+        if not self._is_lazy():
+            return self._records
+
+        if self._filtered_cache is None:
+            positions = self._filtered_positions()
+            records = self._source._records
+            if positions is None:
+                self._filtered_cache = records
+            else:
+                self._filtered_cache = [records[p] for p in positions]
+        return self._filtered_cache
+
+    def _evaluate(self):
+        records = self._filtered()
+
+        if not self.ordering:
+            return list(records)
+
+        if self.ordering == ('?',):
+            return sorted(records, key=lambda x: random.random())
+
+        if not self._lookups:
+            return self._source._sorted(self.ordering)
+
+        return multi_attr_sort(records, self.ordering)
+
+    def _sorted(self, ordering):
+        self._check_record_version()
+        if ordering not in self._sort_cache:
+            self._sort_cache[ordering] = multi_attr_sort(
+                self._records, ordering
+            )
+
+        # copy, so changes to the result don't leak into the cache
+        return list(self._sort_cache[ordering])
+
     def __getitem__(self, item):
+        # [:k] (or [i]) of a not yet evaluated ordered manager only needs the
+        # top k records, not a full sort
+        if self._result_cache is None and self.ordering not in [None, ('?',)]:
+            if isinstance(item, int) and item >= 0:
+                return multi_attr_top(self._filtered(), self.ordering,
+                                      item + 1)[item]
+
+            if (isinstance(item, slice) and item.step in [None, 1]
+                    and (item.start or 0) >= 0
+                    and item.stop is not None and item.stop >= 0):
+                return multi_attr_top(self._filtered(), self.ordering,
+                                      item.stop)[item.start:]
+
         return self._records[item]
 
     def __iter__(self):
         return iter(self._records)
 
     def __len__(self):
-        return len(self._records)
+        if self._result_cache is not None:
+            return len(self._result_cache)
+        # no need to sort just to count
+        return len(self._filtered())
 
     def __add__(self, other):
         return self._clone(new_records=self._records + other._records)
 
-    def fake(self, count):
-        fake_records = []
+    def fake(self, count, seed=None, workers=None):
+        """
+        count fake records, generated a column at a time in chunks of
+        FAKE_CHUNK_SIZE rows. The same seed gives the same records (and
+        uuids), also with workers > 1, which generates chunks in a process
+        pool.
+        """
+        model_class = self.model_class
+        # only types, declared Fields' extractors may not pickle for workers
+        fields = [
+            (field_name, field_type.type
+             if isinstance(field_type, Field) else field_type)
+            for field_name, field_type in model_class._schema.items()
+            if field_name not in ['id', 'pk', 'uuid']
+        ]
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        elif model_class.Meta.uuids == 'random':
+            fields.append(('uuid', UUID))
+
+        chunks = [
+            (fields, min(FAKE_CHUNK_SIZE, count - start), (seed, start),
+             fake.locales)
+            for start in range(0, count, FAKE_CHUNK_SIZE)
+        ]
+        if workers and workers > 1 and len(chunks) > 1 and \
+                'fork' in multiprocessing.get_all_start_methods():
+            with ProcessPoolExecutor(
+                min(workers, len(chunks)),
+                mp_context=multiprocessing.get_context('fork')
+            ) as pool:
+                columns = list(pool.map(fake_columns, *zip(*chunks)))
+        else:
+            columns = [fake_columns(*chunk) for chunk in chunks]
 
-        def fake_value(type, field_name):
-            if type == int:
-                return fake.pyint()
-            elif type == float:
-                return fake.pyfloat()
-            elif type == bool:
-                return fake.pybool()
-            elif type == str:
-                custom_faker = getattr(fake, field_name, None)
-                if custom_faker:
-                    return custom_faker()
+        names = [field_name for field_name, _ in fields]
+        batch = model_class.__init__ is DjamixModel.__init__
+        fake_records = []
+        for chunk in columns:
+            for values in zip(*(chunk[name] for name in names)):
+                kwargs = dict(zip(names, values))
+                if batch:
+                    fake_record = model_class.__new__(model_class)
+                    fake_record.__dict__.update(kwargs)
                 else:
-                    return words(3, common=False)
-                    return fake.pystr()
-            elif type == datetime.date:
-                return fake.date_object()
-            else:
-                raise ValueError("UNKOWN TYPE!", type)
+                    fake_record = model_class(**kwargs)
+                fake_records.append(fake_record)
 
-        for i in range(count):
-            kwargs = {
-                field_name: fake_value(field_type, field_name)
-                for field_name, field_type in self.model_class._schema.items()
-                if field_name not in ['id', 'pk', 'uuid']
-            }
-            fake_record = self.model_class(**kwargs)
-            fake_records.append(fake_record)
+        if batch:
+            DjamixModelMeta.assign_ids(model_class, fake_records)
 
         return self._clone(fake_records)
 
-    def precreate_fake(self, count):
-        fake = self.fake(count)
+    def precreate_fake(self, count, seed=None, workers=None):
+        fake = self.fake(count, seed=seed, workers=workers)
         self._records += fake._records
 
+    def export(self, filename, cache=False):
+        """
+        Writes records to a fixture that can be loaded with Meta.fixture,
+        with cache=True also its fixture cache, so even the first load doesn't
+        have to parse it.
+        """
+        write_fixture(self.model_class, self, filename)
+        if cache:
+            DjamixModelMeta.write_fixture_cache(self.model_class, filename)
+
+    def _invalidate_caches(self):
+        self._indexes = {}
+        self._range_indexes = {}
+        self._sort_cache = {}
+        self._groupby_cache = {}
+        self._numpy_columns = {}
+
+    def _check_record_version(self):
+        """
+        Drops the caches if records were changed in place (see
+        DjamixModel.__setattr__) since they were built.
+        """
+        version = getattr(self.model_class, '_record_version', 0)
+        if version != self._record_version:
+            self._invalidate_caches()
+            self._record_version = version
+
+    def _is_indexable(self, field):
+        """
+        Model managers (the ones without `previous`) index every schema field
+        on first lookup, derived managers only fields from Meta.indexes.
+        """
+        self._check_record_version()
+        if field in self._indexes:
+            return self._indexes[field] is not UNINDEXABLE
+
+        if self.previous is None:
+            return field in self.model_class._schema
+
+        return field in (getattr(self.model_class.Meta, 'indexes', None) or [])
+
+    def _get_index(self, field):
+        """
+        Returns a {value: [positions in _records]} mapping for a given field,
+        building it on first use. Returns None if field can't be indexed.
+        """
+        self._check_record_version()
+        index = self._indexes.get(field)
+        if index is None:
+            index = defaultdict(list)
+            try:
+                for position, record in enumerate(self._records):
+                    value = getattr(record, field, None)
+                    if callable(value):
+                        raise TypeError("Can't index callable %s" % field)
+                    index[value].append(position)
+            except TypeError:
+                index = UNINDEXABLE
+            else:
+                index = dict(index)
+
+            self._indexes[field] = index
+
+        if index is UNINDEXABLE:
+            return None
+        return index
+
+    def _lookup_index(self, field, value):
+        """
+        Returns positions of records with field equal to value, or None if
+        the index can't answer that.
+        """
+        if not self._is_indexable(field):
+            return None
+
+        index = self._get_index(field)
+        if index is None:
+            return None
+
+        try:
+            return index.get(value, [])
+        except TypeError:
+            # unhashable lookup value
+            return None
+
     def all(self):
         return self
 
-    def get(self, **kwargs):
-        filtered = self.filter(**kwargs)
+    def _get_range_index(self, field):
+        """
+        Returns (sorted keys, positions) for fields declared in
+        Meta.range_indexes, building it on first use. Only model managers keep
+        range indexes, sorting a derived manager is more costly than a scan.
+        """
+        if self.previous is not None:
+            return None
+        if field not in (getattr(self.model_class.Meta, 'range_indexes', None)
+                         or []):
+            return None
+
+        self._check_record_version()
+        index = self._range_indexes.get(field)
+        if index is None:
+            pairs = []
+            for position, record in enumerate(self._records):
+                value = getattr(record, field, None)
+                if callable(value):
+                    pairs = UNINDEXABLE
+                    break
+                # None never matches the range lookups, so it's left out
+                if value is not None:
+                    pairs.append((value, position))
+
+            if pairs is not UNINDEXABLE:
+                try:
+                    pairs.sort()
+                except TypeError:
+                    pairs = UNINDEXABLE
+
+            if pairs is UNINDEXABLE:
+                index = UNINDEXABLE
+            else:
+                index = ([k for k, _ in pairs], [p for _, p in pairs])
+            self._range_indexes[field] = index
+
+        if index is UNINDEXABLE:
+            return None
+        return index
+
+    def _lookup_range_index(self, field, lookup, value):
+        """
+        Returns positions (in the original order) of records matching range
+        lookup in O(log n + k), or None if there is no usable range index.
+        """
+        index = self._get_range_index(field)
+        if index is None:
+            return None
+
+        keys, positions = index
+        try:
+            if lookup == 'year':
+                if type(keys[0]) == datetime.datetime:  # NOQA
+                    low = datetime.datetime(value, 1, 1)
+                    high = datetime.datetime.combine(
+                        datetime.date(value, 12, 31), datetime.time.max
+                    )
+                elif type(keys[0]) == datetime.date:  # NOQA
+                    low = datetime.date(value, 1, 1)
+                    high = datetime.date(value, 12, 31)
+                else:
+                    return None
+                lookup, value = 'range', (low, high)
+
+            if lookup == 'gt':
+                start, stop = bisect_right(keys, value), len(keys)
+            elif lookup == 'gte':
+                start, stop = bisect_left(keys, value), len(keys)
+            elif lookup == 'lt':
+                start, stop = 0, bisect_left(keys, value)
+            elif lookup == 'lte':
+                start, stop = 0, bisect_right(keys, value)
+            else:
+                start = bisect_left(keys, value[0])
+                stop = bisect_right(keys, value[1])
+        except (TypeError, ValueError, IndexError):
+            # eg. comparing dates with strings, or an empty index
+            return None
+
+        return sorted(positions[start:stop])
+
+    def get(self, *args, **kwargs):
+        filtered = self.filter(*args, **kwargs)._filtered()
         if len(filtered) > 1:
             raise self.model_class.MultipleObjectsReturned(
                 "It didnt' return 1 object it returned %s" % len(filtered)
@@ -331,58 +1316,331 @@ class DjamixManager:
         else:
             return filtered[0]
 
-    def filter(self, **kwargs):
-        filters = {}
-        for key, value in kwargs.items():
-            elements = key.split("__")
-            if len(elements) == 1:
-                filters[f'{key}={value}'] = partial(
-                    filter_including_callables,
-                    key=key,
-                    value=value
-                )
+    def _parse_lookup(self, key, value):
+        """
+        "name__startswith" -> ("name", "startswith", value)
+        "town__country__iso" -> ("town", RELATED_LOOKUP, ("country__iso", v))
+        """
+        elements = key.split("__")
+        if len(elements) == 1:
+            return (key, None, value)
 
-            elif len(elements) == 2:
+        if len(elements) == 2 and elements[1] in FILTER_FUNCTIONS:
+            if elements[1] == 'in':
                 try:
-                    function = FILTER_FUNCTIONS[elements[1]]
-                except KeyError:
-                    raise ValueError(
-                        "Unsupported lookup type `%s`" % elements[1]
-                    )
+                    value = frozenset(value)
+                except TypeError:
+                    value = tuple(value)
+            return (elements[0], elements[1], value)
+
+        fkeys = getattr(self.model_class, '_fkeys', {})
+        if elements[0] in fkeys:
+            related_key = '__'.join(elements[1:])
+            # validate it right away, it's evaluated later
+            fkeys[elements[0]].target_class.objects._parse_lookup(
+                related_key, value
+            )
+            return (elements[0], RELATED_LOOKUP, (related_key, value))
+
+        if len(elements) == 2:
+            raise ValueError(
+                "Unsupported lookup type `%s`" % elements[1]
+            )
 
-                filters[f'{elements[1]}={key}={value}'] = partial(
-                    filter_including_callables,
-                    key=elements[0],
-                    value=value,
-                    operation=function,
+        raise NotImplementedError(
+            "Chained dunder lookups not supported yet"
+        )
+
+    def _parse_lookups(self, args, kwargs):
+        return [self._parse_q(q) for q in args] + [
+            self._parse_lookup(key, value) for key, value in kwargs.items()
+        ]
+
+    def _parse_q(self, q):
+        return Q._new([
+            self._parse_q(c) if isinstance(c, Q) else self._parse_lookup(*c)
+            for c in q.children
+        ], q.connector, q.negated)
+
+    def _resolve_related_lookups(self, lookups):
+        """
+        Semi-join: runs every related lookup against the related model (using
+        its indexes) once, and replaces it with (field, RELATED_LOOKUP, pks of
+        the matches).
+        """
+        output = []
+        for lookup in lookups:
+            if isinstance(lookup, Q):
+                lookup = Q._new(self._resolve_related_lookups(lookup.children),
+                                lookup.connector, lookup.negated)
+
+            elif lookup[1] == RELATED_LOOKUP:
+                field, _, (related_key, value) = lookup
+                fk = self.model_class._fkeys[field]
+                matches = fk.target_class.objects.filter(
+                    **{related_key: value}
                 )
-            else:
-                raise NotImplementedError(
-                    "Chained dunder lookups not supported yet"
+                lookup = (
+                    field, RELATED_LOOKUP, frozenset(t.pk for t in matches)
                 )
 
-        filtered = [
-            record
-            for record in self.all()
-            if all(_filter(record) for _filter in filters.values())
+            output.append(lookup)
+        return output
+
+    def _lookup_related_index(self, field, pks):
+        """
+        Positions of records pointing to any of the related pks, using the
+        hash index on fk field (so it only iterates over distinct targets).
+        """
+        if not self._is_indexable(field):
+            return None
+
+        index = self._get_index(field)
+        if index is None:
+            return None
+
+        return sorted(
+            position
+            for target, positions in index.items()
+            if target is not None and target.pk in pks
+            for position in positions
+        )
+
+    def _numpy_column(self, field):
+        """
+        Values of int, float or date field as a numpy array, built on first
+        use. Only for model managers and only if numpy is installed.
+        """
+        if numpy is None or self.previous is not None:
+            return None
+
+        self._check_record_version()
+        if field not in self._numpy_columns:
+            self._numpy_columns[field] = self._build_numpy_column(field)
+
+        column = self._numpy_columns[field]
+        if column is UNINDEXABLE:
+            return None
+        return column
+
+    def _build_numpy_column(self, field):
+        schema = self.model_class._schema
+        field_type = schema.get(field) if isinstance(schema, dict) else None
+        if isinstance(field_type, Field):
+            field_type = field_type.type
+
+        dtype = NUMPY_TYPES.get(field_type)
+        if dtype is None:
+            return UNINDEXABLE
+
+        records = self._records
+        column = getattr(self.model_class, '_columns', {}).get(field)
+        if isinstance(column, DateColumn) and dtype == 'datetime64[D]':
+            column = column.ordinals
+            epoch = datetime.date(1970, 1, 1).toordinal()
+        else:
+            epoch = None
+
+        if isinstance(records, ColumnarRows) and \
+                isinstance(column, (array, memoryview)):
+            if isinstance(column, memoryview):
+                # store columns are read only, so a view is safe
+                values = numpy.asarray(column)
+                if epoch is not None:
+                    values = (values - epoch).astype(dtype)
+                elif values.dtype != dtype:
+                    values = values.astype(dtype)
+            else:
+                # copy, a view would lock the array from growing
+                values = numpy.array(column, dtype=dtype)
+            if records.order is not None:
+                values = values[numpy.asarray(records.order, dtype='int64')]
+            return values
+
+        values = [getattr(record, field, None) for record in records]
+        if field_type == datetime.date:
+            valid = all(type(v) == datetime.date for v in values)  # NOQA
+        elif field_type == int:
+            # int64 would silently truncate floats
+            valid = all(type(v) in (int, bool) for v in values)
+        else:
+            valid = all(isinstance(v, (int, float)) for v in values)
+
+        if not valid:
+            # Nones, model methods, datetimes, etc. – leave them to python
+            return UNINDEXABLE
+
+        try:
+            return numpy.array(values, dtype=dtype)
+        except (TypeError, ValueError, OverflowError):
+            return UNINDEXABLE
+
+    def _numpy_mask(self, field, lookup, value):
+        if lookup not in NUMPY_LOOKUPS:
+            return None
+
+        column = self._numpy_column(field)
+        if column is None:
+            return None
+        return numpy_mask(column, lookup, value)
+
+    def _numpy_values(self, field):
+        """
+        numpy values of field for the (filtered) records of this manager
+        """
+        column = self._source._numpy_column(field)
+        if column is None:
+            return None
+
+        positions = self._filtered_positions()
+        if positions is None:
+            return column
+        return column[numpy.asarray(positions, dtype='int64')]
+
+    def _index_positions(self, lookup):
+        """
+        Positions of records matching a single (field, lookup, value) as
+        given by the indexes, or None if there are no indexes to answer that.
+        """
+        field, name, value = lookup
+        if name in [None, 'exact']:
+            return self._lookup_index(field, value)
+
+        if name in RANGE_LOOKUPS:
+            return self._lookup_range_index(field, name, value)
+
+        if name == RELATED_LOOKUP:
+            return self._lookup_related_index(field, value)
+
+        if name == 'in':
+            positions = set()
+            for v in value:
+                bucket = self._lookup_index(field, v)
+                if bucket is None:
+                    return None
+                positions.update(bucket)
+            return positions
+
+        return None
+
+    def _lookup_positions(self, lookup):
+        """
+        Positions of records matching a single lookup or a Q node, as given
+        by the indexes or numpy, or None if they can't answer that.
+        """
+        if isinstance(lookup, Q):
+            if lookup.connector == Q.AND:
+                positions = self._and_positions(lookup.children)
+            else:
+                positions = set()
+                for child in lookup.children:
+                    child_positions = self._lookup_positions(child)
+                    if child_positions is None:
+                        # would need a full scan anyway
+                        return None
+                    positions.update(child_positions)
+
+            if positions is None or not lookup.negated:
+                return positions
+            return set(range(len(self._records))).difference(positions)
+
+        positions = self._index_positions(lookup)
+        if positions is None:
+            mask = self._numpy_mask(*lookup)
+            if mask is not None:
+                positions = numpy.flatnonzero(mask).tolist()
+        return positions
+
+    def _and_positions(self, lookups):
+        """
+        Positions of records matching all the lookups – the smallest answer
+        from the indexes, narrowed down by numpy masks of the lookups they
+        couldn't answer and then by checking the rest of lookups.
+        """
+        candidates = None
+        answered = []
+        mask = None
+        masked = []
+        for lookup in lookups:
+            if isinstance(lookup, Q):
+                positions = self._lookup_positions(lookup)
+            else:
+                positions = self._index_positions(lookup)
+
+            if positions is not None:
+                if candidates is None or len(positions) < len(candidates):
+                    candidates = positions
+                    answered = [lookup]
+
+            elif not isinstance(lookup, Q):
+                lookup_mask = self._numpy_mask(*lookup)
+                if lookup_mask is not None:
+                    mask = lookup_mask if mask is None else mask & lookup_mask
+                    masked.append(lookup)
+
+        if mask is not None:
+            if candidates is None:
+                candidates = numpy.flatnonzero(mask).tolist()
+                answered = masked
+            else:
+                positions = numpy.array(sorted(candidates), dtype='int64')
+                candidates = positions[mask[positions]].tolist()
+                answered = answered + masked
+
+        if candidates is None:
+            return None
+
+        # no need to check again what was already answered
+        rest = [
+            lk for lk in lookups if not any(lk is a for a in answered)
         ]
+        if not rest:
+            return candidates
 
-        return self._clone(filtered)
+        predicate = compile_lookups(self.model_class, rest)
+        records = self._records
+        return [p for p in sorted(candidates) if predicate(records[p])]
+
+    def _match_positions(self, lookups):
+        """
+        Returns sorted positions of records matching all lookups, checking
+        only the smallest set of candidates the indexes (or numpy) can give.
+        """
+        lookups = self._resolve_related_lookups(lookups)
+
+        positions = self._and_positions(lookups)
+        if positions is None:
+            predicate = compile_lookups(self.model_class, lookups)
+            return [
+                i for i, record in enumerate(self._records)
+                if predicate(record)
+            ]
+
+        return sorted(positions)
+
+    def filter(self, *args, **kwargs):
+        lookups = self._parse_lookups(args, kwargs)
+        return self._chain(lookups, ordering=self.ordering
+                           if self._is_lazy() else None)
+
+    def exclude(self, *args, **kwargs):
+        lookups = [~Q._new(self._parse_lookups(args, kwargs))]
+        return self._chain(lookups, ordering=self.ordering
+                           if self._is_lazy() else None)
 
     def count(self):
         return len(self)
 
     def order_by(self, *sorting):
-        if len(sorting) == 1 and sorting[0] == '?':
-            # return random order
-            return self._clone(
-                sorted(self._records, key=lambda x: random.random()),
-                ordering=sorting,
-            )
-        new_records = multi_attr_sort(self._records, sorting)
-        return self._clone(new_records, ordering=sorting)
+        if sorting != ('?',) and self._is_lazy() and self.ordering \
+                and self.ordering != ('?',):
+            # sorting is stable, so sorting again by new columns is the same
+            # as sorting once by new columns followed by the old ones
+            sorting = sorting + tuple(self.ordering)
+
+        return self._chain(ordering=sorting)
 
-    def groupby(self, keyfunc):
+    def groupby(self, keyfunc, hashed=False):
         """
         If you wanted to use itertools.groupby result in the templates it would
         break due to templates wanting to know the length (which Groupers do
@@ -392,26 +1650,448 @@ class DjamixManager:
             /itertools-groupby-in-a-django-template
 
         One of the solutions is to repackage as a list of tuples.
+
+        itertools.groupby only groups consecutive records, so they need to be
+        ordered by the key first. With hashed=True records are grouped with a
+        dict instead (no ordering needed, groups in first seen order).
+        keyfunc can also be a field name, results for field names are cached
+        (callables are usually new lambdas on every call, so they aren't).
+        """
+        self._check_record_version()
+        cache_key = (keyfunc, hashed)
+        cacheable = isinstance(keyfunc, str)
+        if not cacheable or cache_key not in self._groupby_cache:
+            if isinstance(keyfunc, str):
+                field = keyfunc
+
+                def keyfunc(record):
+                    return resolve_value(record, field)
+
+            if hashed:
+                groups = {}
+                for record in self:
+                    key = keyfunc(record)
+                    if key in groups:
+                        groups[key].append(record)
+                    else:
+                        groups[key] = [record]
+                grouped = list(groups.items())
+            else:
+                grouped = [
+                    (x, list(y)) for x, y in itertools.groupby(self, keyfunc)
+                ]
+
+            if not cacheable:
+                return grouped
+            self._groupby_cache[cache_key] = grouped
+
+        return list(self._groupby_cache[cache_key])
+
+    def aggregate(self, *args, **kwargs):
+        """
+        .aggregate(Sum('population'), avg=Avg('area')) ->
+            {'population__sum': ..., 'avg': ...}
+
+        All aggregates are computed in a single pass over the records (or
+        with numpy for int, float and date fields, if it's installed).
         """
-        return [(x, list(y)) for x, y in itertools.groupby(self, keyfunc)]
+        aggregates = named_aggregates(args, kwargs)
+        aliases = list(aggregates)
+
+        result = {}
+        for alias in aliases:
+            value = self._numpy_aggregate(aggregates[alias])
+            if value is not NotImplemented:
+                result[alias] = value
+                del aggregates[alias]
+
+        if aggregates:
+            result.update(aggregate_records(self, aggregates))
+        return {alias: result[alias] for alias in aliases}
+
+    def _numpy_aggregate(self, agg):
+        if type(agg) not in [Sum, Avg, Min, Max, Count]:
+            return NotImplemented
+
+        values = self._numpy_values(agg.field)
+        if values is None:
+            return NotImplemented
+
+        if isinstance(agg, Count):
+            return len(values)
+        if not len(values):
+            return None
+        if isinstance(agg, Min):
+            return values.min().item()
+        if isinstance(agg, Max):
+            return values.max().item()
+
+        total = numpy_sum(values)
+        if total is None:
+            return NotImplemented
+        if isinstance(agg, Sum):
+            return total
+        return total / len(values)
+
+    def values(self, *fields):
+        return DjamixValues(self, fields or list(self.model_class._schema))
 
     def sum(self, *fields):
         """
-        This is a simpler implementation of .aggregate(Sum('f1'), Sum('f2')
-        To be upgraded later for full implementation of aggregates
+        This is a simpler version of .aggregate(Sum('f1'), Sum('f2')), that
+        returns {'f1': ..., 'f2': ...}
         """
         sums = defaultdict(int)
-        for r in self:
-            for f in fields:
-                sums[f] += getattr(r, f)
+        python_fields = []
+        for f in fields:
+            values = self._numpy_values(f)
+            total = None if values is None else numpy_sum(values)
+            if total is None:
+                python_fields.append(f)
+            elif len(values):
+                sums[f] = total
+
+        if python_fields:
+            for r in self:
+                for f in python_fields:
+                    sums[f] += getattr(r, f)
+
+        # flatten to regular dict instead of defaultdict
+        return {f: sums[f] for f in fields if f in sums}
+
+    def to_rich_json_representation(self):
+        # FIXME: fix the name
+        out = [record.to_dict() for record in self]
+        return out
+
+
+class DjamixValues:
+    """
+    Returned by manager.values(*fields), iterates over dicts of field values.
+    Use .annotate() to group by those fields.
+    """
+
+    def __init__(self, manager, fields):
+        self.manager = manager
+        self.fields = list(fields)
+
+    def __iter__(self):
+        for record in self.manager:
+            yield {f: resolve_value(record, f) for f in self.fields}
+
+    def __len__(self):
+        return len(self.manager)
+
+    def __getitem__(self, item):
+        return list(self)[item]
+
+    def annotate(self, *args, **kwargs):
+        """
+        .values('continent').annotate(total=Sum('population')) ->
+            [{'continent': 'Europe', 'total': ...}, ...]
+
+        Groups are hashed (no need to order the records first) and all
+        aggregates are computed in a single pass.
+        """
+        return aggregate_records(
+            self.manager, named_aggregates(args, kwargs), self.fields
+        )
+
+    def aggregate(self, *args, **kwargs):
+        return self.manager.aggregate(*args, **kwargs)
+
+
+def make_column(values, field_type):
+    """
+    Compacts list of values into a column – array for ints and floats,
+    interned strings for str, or just a list for everything else (or if the
+    values don't fit the array, eg. there are Nones)
+    """
+    if isinstance(field_type, Field):
+        field_type = field_type.type
+
+    if field_type in [int, float]:
+        try:
+            return array('q' if field_type == int else 'd', values)
+        except (TypeError, OverflowError):
+            return values
+
+    if field_type == str:
+        return [sys.intern(v) if type(v) == str else v  # NOQA
+                for v in values]
+
+    return values
+
+
+class ColumnField:
+    """
+    Descriptor that reads a field of a row proxy (Meta.storage = 'columnar')
+    from its model's column. Instances created the regular way (eg. fake
+    ones) keep their values in __dict__ as usual.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        row = instance.__dict__.get('_row')
+        if row is None:
+            return instance.__dict__.get(self.name)
+        return owner._columns[self.name][row]
+
+    def __set__(self, instance, value):
+        row = instance.__dict__.get('_row')
+        if row is None:
+            instance.__dict__[self.name] = value
+            return
+
+        columns = type(instance)._columns
+        try:
+            columns[self.name][row] = value
+        except (TypeError, OverflowError):
+            # value doesn't fit the array anymore or it's a read only store
+            columns[self.name] = list(columns[self.name])
+            columns[self.name][row] = value
+
+
+class ColumnarRows(Sequence):
+    """
+    Records of a columnar model. Row proxies are created on access, so only
+    the columns are kept in memory. order is an optional permutation of rows
+    (eg. sorted by Meta.ordering).
+    """
+
+    def __init__(self, model_class, order=None):
+        self.model_class = model_class
+        self.order = order
+
+    def _row(self, row):
+        proxy = object.__new__(self.model_class)
+        proxy.__dict__['_row'] = row
+        return proxy
+
+    def __len__(self):
+        if self.order is not None:
+            return len(self.order)
+        return len(self.model_class._columns['id'])
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("row index out of range")
+
+        if self.order is not None:
+            return self._row(self.order[item])
+        return self._row(item)
+
+    def __iter__(self):
+        rows = range(len(self)) if self.order is None else self.order
+        for row in rows:
+            yield self._row(row)
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __iadd__(self, instances):
+        """
+        Appends regular instances (eg. from .fake()) as new rows
+        """
+        columns = self.model_class._columns
+        for instance in instances:
+            row = len(columns['id'])
+            for name, column in columns.items():
+                value = getattr(instance, name, None)
+                try:
+                    column.append(value)
+                except (TypeError, OverflowError, AttributeError):
+                    # full array or a read only store column
+                    columns[name] = list(column)
+                    columns[name].append(value)
+            if self.order is not None:
+                self.order.append(row)
+        return self
+
+    def sorted(self, ordering):
+        rows = multi_attr_sort(self, ordering)
+        return self.__class__(self.model_class,
+                              array('q', (r._row for r in rows)))
+
+
+class StringColumn(Sequence):
+    """
+    Read only str column of a column store – utf-8 blob with offsets
+    """
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        return str(self.blob[self.offsets[row]:self.offsets[row + 1]],
+                   'utf-8')
+
+
+class DateColumn(Sequence):
+    """
+    Read only date column of a column store – ordinals
+    """
+
+    def __init__(self, ordinals):
+        self.ordinals = ordinals
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def __getitem__(self, row):
+        return datetime.date.fromordinal(self.ordinals[row])
+
+
+class RelatedColumn(Sequence):
+    """
+    FK column of a column store – raw values are resolved on access
+    """
+
+    def __init__(self, values, resolve):
+        self.values = values
+        self.resolve = resolve
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, row):
+        return self.resolve(self.values[row])
+
+
+STORE_MAGIC = b'DJAMIXS1'
+
+
+def column_kind(values):
+    for kind, value_type in [('q', int), ('d', float), ('date', datetime.date),
+                             ('str', str)]:
+        if all(type(v) == value_type for v in values):  # NOQA
+            return kind
+    return 'pickle'
+
+
+def write_column_store(filename, header, columns):
+    """
+    Writes columns (name -> list of values) to a column store file: int,
+    float, date and str columns as raw buffers, everything else pickled.
+    """
+    layout = []
+    chunks = []
+    size = 0
+
+    def add(data):
+        nonlocal size
+        start = size
+        padding = b'\0' * (-len(data) % 8)
+        chunks.extend([data, padding])
+        size += len(data) + len(padding)
+        return start, len(data)
+
+    for name, values in columns.items():
+        kind = column_kind(values)
+        try:
+            if kind in ['q', 'd']:
+                parts = [add(array(kind, values).tobytes())]
+            elif kind == 'date':
+                parts = [add(array('q', (v.toordinal() for v in values))
+                             .tobytes())]
+            elif kind == 'str':
+                encoded = [v.encode('utf-8') for v in values]
+                offsets = array('q', [0])
+                for value in encoded:
+                    offsets.append(offsets[-1] + len(value))
+                parts = [add(offsets.tobytes()), add(b''.join(encoded))]
+        except OverflowError:
+            kind = 'pickle'
+        if kind == 'pickle':
+            parts = [add(pickle.dumps(values, pickle.HIGHEST_PROTOCOL))]
+        layout.append((name, kind, parts))
+
+    meta = pickle.dumps(dict(header, columns=layout),
+                        pickle.HIGHEST_PROTOCOL)
+
+    temporary_filename = f'{filename}.{os.getpid()}.tmp'
+    try:
+        with open(temporary_filename, 'wb') as fd:
+            fd.write(STORE_MAGIC)
+            fd.write(len(meta).to_bytes(8, 'little'))
+            fd.write(meta)
+            fd.write(b'\0' * (-len(meta) % 8))
+            fd.writelines(chunks)
+        os.replace(temporary_filename, filename)
+    finally:
+        if os.path.exists(temporary_filename):
+            os.remove(temporary_filename)
+
+
+def open_column_store(filename, header):
+    """
+    Memory maps a column store read only. Returns (meta, columns) or None if
+    there's no store or it was written for a different header.
+    """
+    try:
+        with open(filename, 'rb') as fd:
+            if fd.read(8) != STORE_MAGIC:
+                return None
+            meta_size = int.from_bytes(fd.read(8), 'little')
+            meta = pickle.loads(fd.read(meta_size))
+            if any(meta.get(k) != v for k, v in header.items()):
+                return None
+            # the mapping stays valid after the file is closed
+            store = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        if DEBUG:
+            print("Ignoring column store", filename, e)
+        return None
+
+    base = 16 + meta_size + (-meta_size % 8)
+    view = memoryview(store)
+    columns = OrderedDict()
+    for name, kind, parts in meta['columns']:
+        buffers = [view[base + start:base + start + length]
+                   for start, length in parts]
+        if kind in ['q', 'd']:
+            columns[name] = buffers[0].cast(kind)
+        elif kind == 'date':
+            columns[name] = DateColumn(buffers[0].cast('q'))
+        elif kind == 'str':
+            columns[name] = StringColumn(buffers[0].cast('q'), buffers[1])
+        else:
+            columns[name] = pickle.loads(buffers[0])
 
-        # flatten to regular dict instead of defaultdict
-        return dict(sums)
+    return meta, columns
 
-    def to_rich_json_representation(self):
-        # FIXME: fix the name
-        out = [record.to_dict() for record in self]
-        return out
+
+class DerivedUUID:
+    """
+    uuid of models with Meta.uuids = 'derived' – uuid5 of the model name and
+    id, so it's stable across restarts. Computed on first access.
+    """
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return None
+
+        value = str(uuid5(NAMESPACE_URL, f'{owner.__name__}/{instance.id}'))
+        instance.__dict__['uuid'] = value
+        return value
 
 
 class DjamixModelMeta(type):
@@ -436,38 +2116,284 @@ class DjamixModelMeta(type):
         return managers
 
     @staticmethod
-    def parse_records_file(fd, Meta):
-        # TODO: add mimetype based load of CSV and JSON files
-        if Meta.fixture.split('.')[-1] in ['yml', 'yaml']:
-            records = yaml.load(fd)
-            if not records:
+    def iter_records_file(fd, Meta):
+        """
+        Yields records from the fixture one by one, so instances can be built
+        while the file is still being parsed.
+        """
+        extension = Meta.fixture.split('.')[-1].lower()
+        if extension in ['yml', 'yaml']:
+            empty = True
+            for record in iter_yaml_records(fd, Meta.fixture):
+                empty = False
+                yield record
+
+            if empty:
                 raise FixtureError(
                     f"Sorry the file {Meta.fixture} is empty :("
                 )
-        elif Meta.fixture.split('.')[-1].lower() in ['csv', 'tsv']:
-            records = list(csv.DictReader(fd, delimiter=Meta.delimiter))
+        elif extension in ['csv', 'tsv']:
+            yield from csv.DictReader(fd, delimiter=Meta.delimiter)
+        elif extension == 'json':
+            yield from iter_json_records(fd, Meta.fixture)
+        elif extension in ['jsonl', 'ndjson']:
+            yield from iter_json_lines_records(fd, Meta.fixture)
         else:
             raise FixtureError("Unusported fixture type")
 
-        return records
+    @classmethod
+    def parse_records_file(cls, fd, Meta):
+        return list(cls.iter_records_file(fd, Meta))
 
     @staticmethod
-    def create_instances_from_records(new_model, records):
-        output = []
-        for record in records:
-            new_object = new_model()
+    def make_fk_resolver(fk, Meta):
+        """
+        Returns a function that maps a raw fk value to the target instance.
 
+        Uses a to_field -> positions map built once per target, so resolving
+        every fk in a fixture costs O(N + M) instead of O(N * M) .get() calls.
+        """
+        manager = fk.target_class.objects
+        index = manager._get_index(fk.target_field)
+
+        if index is None:
+            # eg. to_field is a method – fallback to regular lookups
+            def resolve(value):
+                try:
+                    return manager.get(**{fk.target_field: value})
+                except fk.target_class.DoesNotExist as e:
+                    if Meta.enforce_schema:
+                        raise e
+                    return None
+
+            return resolve
+
+        def resolve(value):
+            try:
+                positions = index.get(value, [])
+            except TypeError:
+                matches = manager.filter(**{fk.target_field: value})._records
+            else:
+                matches = [manager._records[i] for i in positions]
+
+            if len(matches) > 1:
+                raise fk.target_class.MultipleObjectsReturned(
+                    "It didnt' return 1 object it returned %s" % len(matches)
+                )
+            elif not matches:
+                if Meta.enforce_schema:
+                    raise fk.target_class.DoesNotExist(
+                        "Not such %s with %s" % (
+                            fk.target_class.__name__,
+                            {fk.target_field: value}
+                        )
+                    )
+                return None
+
+            return matches[0]
+
+        return resolve
+
+    @staticmethod
+    def convert_records(new_model, records):
+        """
+        Yields records as {accessible name: value} dicts, with values converted
+        to the schema types. FK values are left as they are in the fixture,
+        they are resolved when instances are created.
+        """
+        # fixture column -> (accessible name, type, extractor), extractor is
+        # None for FKs
+        plan = {}
+        for record in records:
+            converted = {}
             for fieldname, value in record.items():
-                new_object.set_attribute_with_accessible_name(fieldname, value)
+                try:
+                    name, desired_type, extractor = plan[fieldname]
+                except KeyError:
+                    name, desired_type, extractor = \
+                        new_model.column_plan(fieldname, value)
+                    if fieldname in new_model._fkeys:
+                        extractor = None
+                    plan[fieldname] = name, desired_type, extractor
+
+                if extractor is not None and \
+                        type(value) != desired_type:  # NOQA
+                    value = extractor(value)
+                converted[name] = value
+            yield converted
 
-                if new_model._fkeys and fieldname in new_model._fkeys:
-                    new_object.set_foreign_key(fieldname, value)
+    @classmethod
+    def create_instances_from_records(cls, new_model, records):
+        """
+        records should be already converted (see convert_records)
+        """
+        resolvers = {
+            fieldname: cls.make_fk_resolver(fk, new_model.Meta)
+            for fieldname, fk in new_model._fkeys.items()
+        }
+
+        # without a custom __init__ ids and uuids are assigned in one go
+        # after the instances are created
+        batch = new_model.__init__ is DjamixModel.__init__
+
+        output = []
+        for record in records:
+            if batch:
+                new_object = new_model.__new__(new_model)
+            else:
+                new_object = new_model()
+
+            for name, value in record.items():
+                if name in resolvers:
+                    value = resolvers[name](value)
                     # TODO: figure out reverse managers (aka _set)
+                # new records, no need to let managers know (__setattr__)
+                object.__setattr__(new_object, name, value)
 
             output.append(new_object)
 
+        if batch:
+            cls.assign_ids(new_model, output)
+
         return output
 
+    @staticmethod
+    def assign_ids(new_model, instances):
+        """
+        Assigns ids (and random uuids) to instances created without __init__
+        in one go, keeping the ones they already have.
+        """
+        start = next(new_model._id_sequence)
+        new_model._id_sequence = itertools.count(start + len(instances))
+        random_uuids = new_model.Meta.uuids == 'random'
+
+        for pk, instance in enumerate(instances, start):
+            attributes = instance.__dict__
+            if attributes.get('id') is None:
+                attributes['id'] = pk
+            if random_uuids and attributes.get('uuid') is None:
+                attributes['uuid'] = str(uuid4())
+
+    @staticmethod
+    def collect_columns(new_model, records):
+        """
+        Converted records -> name -> list of values, with new ids and uuids
+        and raw (not yet resolved) FK values.
+        """
+        columns = OrderedDict()
+        count = 0
+        for record in records:
+            for name, value in record.items():
+                if name not in columns:
+                    columns[name] = [None] * count
+                columns[name].append(value)
+
+            count += 1
+            for column in columns.values():
+                if len(column) < count:
+                    column.append(None)
+
+        # ids are assigned in one go, values from the fixture take precedence
+        start = next(new_model._id_sequence)
+        new_model._id_sequence = itertools.count(start + count)
+        generated = OrderedDict(id=range(start, start + count))
+        if new_model.Meta.uuids == 'random':
+            generated['uuid'] = (str(uuid4()) for _ in range(count))
+
+        for name, values in generated.items():
+            if name in columns:
+                generated[name] = [
+                    new if old is None else old
+                    for new, old in zip(values, columns.pop(name))
+                ]
+            else:
+                generated[name] = list(values)
+
+        generated.update(columns)
+        return generated
+
+    @staticmethod
+    def assign_columns(new_model, columns):
+        new_model._columns = columns
+        for name in new_model._columns:
+            setattr(new_model, name, ColumnField(name))
+        return ColumnarRows(new_model)
+
+    @classmethod
+    def create_columns_from_records(cls, new_model, records):
+        """
+        Meta.storage = 'columnar' version of create_instances_from_records,
+        instead of instances it stores every field as a column on the model.
+        """
+        columns = cls.collect_columns(new_model, records)
+
+        for fieldname, fk in new_model._fkeys.items():
+            if fieldname in columns:
+                resolve = cls.make_fk_resolver(fk, new_model.Meta)
+                columns[fieldname] = [resolve(v) for v in columns[fieldname]]
+
+        return cls.assign_columns(new_model, OrderedDict(
+            (name, make_column(values, new_model._schema.get(name)))
+            for name, values in columns.items()
+        ))
+
+    @classmethod
+    def create_from_store(cls, Meta, new_model, parsed=None, header=None):
+        """
+        Meta.storage = 'mmap' – columns are kept in a file next to the fixture
+        and memory mapped read only, so processes using the same fixture
+        share its pages. The store is rebuilt when the fixture changes.
+        Writes to a shared column make a private copy of that column.
+        """
+        filename = Meta.fixture + FIXTURE_STORE_SUFFIX
+        declared = set(new_model._schema)
+        header = dict(header or cls.fixture_header(Meta, new_model))
+
+        store = open_column_store(filename, header)
+        if store is None:
+            if Meta.cache:
+                records = cls.iter_cached_records(
+                    Meta, new_model, parsed, header
+                )
+            else:
+                records = cls.convert_records(
+                    new_model, cls.iter_fixture_records(Meta, parsed)
+                )
+            # the store is written from whole columns anyway
+            records = list(records)
+
+            columns = cls.collect_columns(new_model, records)
+            header['count'] = len(columns['id'])
+            header['schema'] = [
+                (name, field_type)
+                for name, field_type in new_model._schema.items()
+                if name not in declared
+            ]
+            try:
+                write_column_store(filename, header, columns)
+            except (OSError, pickle.PicklingError, TypeError, AttributeError):
+                # can't write next to the fixture – keep it in memory
+                new_model._id_sequence = itertools.count(cls.START_SEQID)
+                return cls.create_columns_from_records(new_model, records)
+
+            store = open_column_store(filename, header)
+
+        meta, columns = store
+        for name, field_type in meta['schema']:
+            new_model._schema.setdefault(name, field_type)
+        new_model._id_sequence = itertools.count(
+            cls.START_SEQID + meta['count']
+        )
+
+        for fieldname, fk in new_model._fkeys.items():
+            if fieldname in columns:
+                resolve = cls.make_fk_resolver(fk, Meta)
+                columns[fieldname] = RelatedColumn(columns[fieldname], resolve)
+                if Meta.enforce_schema:
+                    list(columns[fieldname])
+
+        return cls.assign_columns(new_model, columns)
+
     @staticmethod
     def assign_managers(new_model, managers, list_of_objects):
         for manager_name, manager_class in managers.items():
@@ -485,8 +2411,12 @@ class DjamixModelMeta(type):
         setattr(new_model, '_schema', OrderedDict())
         setattr(new_model, '_fkeys', {})
         setattr(new_model, '_id_sequence', itertools.count(cls.START_SEQID))
+        setattr(new_model, '_record_version', 0)
         setattr(new_model, 'id', None)
-        setattr(new_model, 'uuid', None)
+        if new_model.Meta.uuids == 'derived':
+            setattr(new_model, 'uuid', DerivedUUID())
+        else:
+            setattr(new_model, 'uuid', None)
         return new_model
 
     @staticmethod
@@ -516,30 +2446,299 @@ class DjamixModelMeta(type):
         new_model = cls.assign_managers(new_model, managers, list_of_objects)
         return new_model
 
+    @staticmethod
+    def fixture_source(filename):
+        """
+        (mtime, size, sha256) of the fixture file, used to validate its cache
+        """
+        stat = os.stat(filename)
+        digest = hashlib.sha256()
+        with open(filename, 'rb') as fd:
+            for chunk in iter(lambda: fd.read(1 << 20), b''):
+                digest.update(chunk)
+        return stat.st_mtime_ns, stat.st_size, digest.hexdigest()
+
+    @classmethod
+    def fixture_header(cls, Meta, new_model):
+        """
+        Identifies the fixture and everything that changes its converted
+        records – caches and column stores are only valid for the same one.
+        """
+        return {
+            'source': cls.fixture_source(Meta.fixture),
+            'signature': cls.fixture_signature(Meta, new_model),
+        }
+
+    @staticmethod
+    def fixture_signature(Meta, new_model):
+        """
+        Everything besides the fixture itself that changes converted records.
+        """
+        declared = tuple(
+            (name, repr(typedef), code_fingerprint(typedef.extractor))
+            for name, typedef in new_model._schema.items()
+            if isinstance(typedef, Field)
+        )
+        return (
+            FIXTURE_CACHE_VERSION, Meta.delimiter, Meta.uuids, declared,
+            tuple(sorted(new_model._fkeys)),
+        )
+
+    @staticmethod
+    def open_fixture_cache(cache_filename, header):
+        """
+        Cache file positioned after its header, or None if there's no cache
+        or it's not for this header.
+        """
+        try:
+            fd = open(cache_filename, 'rb')
+        except FileNotFoundError:
+            return None
+
+        try:
+            if pickle.load(fd) == header:
+                return fd
+        except Exception as e:
+            # corrupted or written by some other version – just rebuild it
+            if DEBUG:
+                print("Ignoring fixture cache", cache_filename, e)
+        fd.close()
+        return None
+
+    @classmethod
+    def iter_cached_records(cls, Meta, new_model, parsed=None, header=None):
+        """
+        Yields converted records of the fixture, from the cache file next to
+        it if the fixture (and the declared schema) didn't change since it was
+        written, otherwise from the fixture – (re)writing the cache as they
+        go, FIXTURE_CACHE_CHUNK records at a time.
+
+        Caches are pickles, so they are only as trustworthy as the directory
+        with your fixtures.
+        """
+        cache_filename = Meta.fixture + FIXTURE_CACHE_SUFFIX
+        header = header or cls.fixture_header(Meta, new_model)
+
+        fd = cls.open_fixture_cache(cache_filename, header)
+        if fd is not None:
+            # chunks of records, then a dict with the inferred schema
+            with fd:
+                try:
+                    while True:
+                        chunk = pickle.load(fd)
+                        if isinstance(chunk, dict):
+                            break
+                        yield from chunk
+                except (EOFError, pickle.UnpicklingError) as e:
+                    raise FixtureError(
+                        f"Broken fixture cache {cache_filename} ({e}), "
+                        "remove it to rebuild it"
+                    )
+
+            for name, field_type in chunk['schema']:
+                new_model._schema.setdefault(name, field_type)
+            return
+
+        declared = set(new_model._schema)
+        temporary_filename = f'{cache_filename}.{os.getpid()}.tmp'
+        fd = None
+        chunk = []
+
+        def dump(data):
+            nonlocal fd
+            try:
+                pickle.dump(data, fd, pickle.HIGHEST_PROTOCOL)
+            except (OSError, pickle.PicklingError, TypeError, AttributeError):
+                # values that can't be pickled, full disk, etc.
+                fd.close()
+                os.remove(temporary_filename)
+                fd = None
+
+        try:
+            try:
+                fd = open(temporary_filename, 'wb')
+            except OSError:
+                pass  # eg. read only directory
+            else:
+                dump(header)
+
+            records = cls.convert_records(
+                new_model, cls.iter_fixture_records(Meta, parsed)
+            )
+            for record in records:
+                yield record
+
+                if fd is not None:
+                    chunk.append(record)
+                    if len(chunk) >= FIXTURE_CACHE_CHUNK:
+                        dump(chunk)
+                        chunk = []
+
+            if fd is not None and chunk:
+                dump(chunk)
+            if fd is not None:
+                dump({'schema': [
+                    (name, field_type)
+                    for name, field_type in new_model._schema.items()
+                    if name not in declared
+                ]})
+            if fd is not None:
+                fd.close()
+                os.replace(temporary_filename, cache_filename)
+                fd = None
+        finally:
+            if fd is not None:
+                # not finished – eg. the fixture is broken
+                fd.close()
+                os.remove(temporary_filename)
+
+    @classmethod
+    def write_fixture_cache(cls, model_class, filename):
+        """
+        Writes the cache of a fixture (eg. exported with
+        DjamixManager.export) for models declared like model_class.
+        """
+        shadow = type.__new__(cls, model_class.__name__, (DjamixModel,), {})
+        shadow._schema = OrderedDict(
+            (name, typedef)
+            for name, typedef in model_class._schema.items()
+            if isinstance(typedef, Field) or name in ['id', 'pk', 'uuid']
+        )
+        shadow._fkeys = dict(model_class._fkeys)
+        delimiter = None
+        if filename.split('.')[-1].lower() in ['csv', 'tsv']:
+            delimiter = fixture_delimiter(filename, model_class.Meta.delimiter)
+
+        Meta = SimpleNamespace(
+            fixture=filename, delimiter=delimiter, uuids=model_class.Meta.uuids
+        )
+        for _ in cls.iter_cached_records(Meta, shadow):
+            pass
+
+    @classmethod
+    def create_from_records(cls, new_model, records):
+        if new_model.Meta.storage == 'columnar':
+            return cls.create_columns_from_records(new_model, records)
+        return cls.create_instances_from_records(new_model, records)
+
+    @classmethod
+    def iter_fixture_records(cls, Meta, parsed=None):
+        """
+        Raw records of the fixture – already parsed ones (eg. by
+        load_pending_fixtures) or read from the file.
+        """
+        if parsed is not None:
+            yield from parsed
+            return
+
+        with open(Meta.fixture) as fd:
+            yield from cls.iter_records_file(fd, Meta)
+
+    @classmethod
+    def has_fresh_cache(cls, Meta, new_model, header):
+        """
+        True if the fixture doesn't have to be parsed, because its column store
+        or cache is up to date (for header from fixture_header).
+        """
+        if Meta.storage == 'mmap':
+            filename = Meta.fixture + FIXTURE_STORE_SUFFIX
+            return open_column_store(filename, header) is not None
+
+        if Meta.cache:
+            try:
+                with open(Meta.fixture + FIXTURE_CACHE_SUFFIX, 'rb') as fd:
+                    return pickle.load(fd) == header
+            except Exception:
+                return False
+
+        return False
+
     @classmethod
-    def create_from_fixtures(cls, Meta, new_model):
+    def create_from_fixtures(cls, Meta, new_model, parsed=None, header=None):
+        """
+        header is fixture_header, if it was computed already
+        """
         if Meta.fixture:
             autoreload._cached_filenames.append(Meta.fixture)
 
-            with open(Meta.fixture) as fd:
-                records = cls.parse_records_file(fd, Meta)
+            if Meta.storage == 'mmap':
+                return cls.create_from_store(Meta, new_model, parsed, header)
 
-            return cls.create_instances_from_records(new_model, records)
+            if Meta.cache:
+                records = cls.iter_cached_records(
+                    Meta, new_model, parsed, header
+                )
+            else:
+                records = cls.convert_records(
+                    new_model, cls.iter_fixture_records(Meta, parsed)
+                )
+            return cls.create_from_records(new_model, records)
         else:
             return []
 
+    @classmethod
+    def load_model(cls, new_model, body, parsed=None, header=None):
+        records = cls.create_from_fixtures(
+            new_model.Meta, new_model, parsed, header
+        )
+        new_model = cls.extract_and_assign_managers(new_model, body, records)
+        records_changed()
+
+        djamix_models[new_model.__name__] = new_model
+        print_model_summary(new_model.__name__, new_model)
+        return new_model
+
+    @classmethod
+    def load_pending(cls, new_model, parsed=None, header=None):
+        """
+        The model stays in pending_models until it's loaded, so a failed load
+        raises the same error again on next use.
+        """
+        loading_models.add(new_model)
+        try:
+            body = pending_models[new_model]
+            cls.load_model(new_model, body, parsed, header)
+        finally:
+            loading_models.discard(new_model)
+        del pending_models[new_model]
+
+    def __getattr__(cls, name):
+        # lazy models and ones waiting for load_pending_fixtures() are loaded
+        # on first use (but not by probing for special methods or while
+        # they're being loaded)
+        if name.startswith('__') or cls not in pending_models \
+                or cls in loading_models:
+            raise AttributeError(
+                f"type object '{cls.__name__}' has no attribute '{name}'"
+            )
+
+        type(cls).load_pending(cls)
+        return getattr(cls, name)
+
     @staticmethod
     def handle_default_meta_options(Meta):
         META_OPTIONS_WITH_DEFAULTS = [
             ('fixture', None),
             ('delimiter', None),
-            ('enforce_schema', False)
+            ('enforce_schema', False),
+            ('indexes', ()),
+            ('range_indexes', ()),
+            ('storage', 'objects'),
+            ('cache', FIXTURE_CACHE),
+            ('lazy', LAZY_FIXTURES),
+            ('uuids', 'random'),
         ]
         for option, default in META_OPTIONS_WITH_DEFAULTS:
             opt = getattr(Meta, option, None)
             if opt is None:
                 setattr(Meta, option, default)
 
+        if Meta.storage not in ['objects', 'columnar', 'mmap']:
+            raise DjamixException("Unknown storage %s" % Meta.storage)
+
+        if Meta.uuids not in ['random', 'derived']:
+            raise DjamixException("Unknown uuids %s" % Meta.uuids)
+
         return Meta
 
     def __new__(cls, new_class_name, bases, body):
@@ -558,12 +2757,191 @@ class DjamixModelMeta(type):
         new_model = cls.prepopulate_schema(new_model)
         new_model = cls.setup_fields_and_fkeys(new_model, body)
 
-        records = cls.create_from_fixtures(Meta, new_model)
-        new_model = cls.extract_and_assign_managers(new_model, body, records)
+        if Meta.fixture and (Meta.lazy or FIXTURE_WORKERS):
+            pending_models[new_model] = body
+            djamix_models[new_class_name] = new_model
+            return new_model
 
-        djamix_models[new_class_name] = new_model
-        print_model_summary(new_class_name, new_model)
-        return new_model
+        return cls.load_model(new_model, body)
+
+
+def code_fingerprint(function):
+    """
+    Identifies a function by its code, so it changes when the code is edited
+    (all lambdas share the same name).
+    """
+    code = getattr(function, '__code__', None)
+    name = getattr(function, '__qualname__', type(function).__qualname__)
+    if code is None:
+        return name
+
+    digest = hashlib.sha256()
+
+    def feed(code):
+        digest.update(code.co_code)
+        digest.update(repr(code.co_names).encode())
+        for const in code.co_consts:
+            if isinstance(const, CodeType):
+                feed(const)
+            else:
+                digest.update(repr(const).encode())
+
+    feed(code)
+    return f'{name}:{digest.hexdigest()}'
+
+
+def fixture_delimiter(filename, delimiter=None):
+    """
+    Delimiter used by write_fixture for csv/tsv files
+    """
+    if delimiter:
+        return delimiter
+    return '\t' if filename.lower().endswith('.tsv') else ','
+
+
+def plain_value(value):
+    if isinstance(value, DjamixModel):
+        return value.pk
+    if isinstance(value, tuple):
+        return [plain_value(v) for v in value]
+    return value
+
+
+def write_fixture(model_class, records, filename):
+    """
+    Writes records as a fixture for model_class – YAML, CSV/TSV, JSON or JSON
+    Lines, depending on the extension. FKs are written as their to_field
+    values, ids and uuids are left out.
+    """
+    fields = [
+        name for name in model_class._schema
+        if name not in ['id', 'pk', 'uuid']
+    ]
+    fkeys = model_class._fkeys
+
+    def rows():
+        for record in records:
+            row = {}
+            for name in fields:
+                value = getattr(record, name, None)
+                if name in fkeys and isinstance(value, DjamixModel):
+                    value = getattr(value, fkeys[name].target_field)
+                row[name] = plain_value(value)
+            yield row
+
+    extension = filename.split('.')[-1].lower()
+    with open(filename, 'w', newline='') as fd:
+        if extension in ['yml', 'yaml']:
+            yaml.dump(list(rows()), fd, allow_unicode=True, sort_keys=False,
+                      Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper))
+        elif extension in ['csv', 'tsv']:
+            writer = csv.DictWriter(
+                fd, fields, delimiter=fixture_delimiter(
+                    filename, model_class.Meta.delimiter
+                )
+            )
+            writer.writeheader()
+            writer.writerows(rows())
+        elif extension == 'json':
+            json.dump(list(rows()), fd, cls=DjamixJSONEncoder)
+        elif extension in ['jsonl', 'ndjson']:
+            for row in rows():
+                fd.write(json.dumps(row, cls=DjamixJSONEncoder))
+                fd.write('\n')
+        else:
+            raise FixtureError("Unusported fixture type")
+
+
+def export_fake(model_name, count, filename, seed=None, *options):
+    """
+    ./manage.py export_fake <Model> <count> <fixture> [<seed>] [--cache]
+
+    Generates fake records of a model and writes them to a fixture.
+    """
+    if seed == '--cache':
+        seed, options = None, (seed,) + options
+
+    model_class = djamix_models[model_name]
+    records = model_class.objects.fake(
+        int(count), seed=None if seed is None else int(seed)
+    )
+    records.export(filename, cache='--cache' in options)
+    return f"Exported {len(records)} {model_name} records to {filename}"
+
+
+def parse_fixture(fixture, delimiter):
+    """
+    Raw records of a fixture file, runs in load_pending_fixtures' workers
+    """
+    Meta = SimpleNamespace(fixture=fixture, delimiter=delimiter)
+    with open(fixture) as fd:
+        return list(DjamixModelMeta.iter_records_file(fd, Meta))
+
+
+def fk_ordered(models):
+    """
+    Sorts models so FK targets come before models that point to them
+    """
+    ordered = []
+    seen = set()
+
+    def visit(model):
+        if model in seen:
+            return
+        seen.add(model)
+        for fk in model._fkeys.values():
+            if fk.target_class in models:
+                visit(fk.target_class)
+        ordered.append(model)
+
+    for model in models:
+        visit(model)
+    return ordered
+
+
+def load_pending_fixtures(workers=None):
+    """
+    Loads fixtures of models defined with FIXTURE_WORKERS set. Fixtures are
+    parsed concurrently in a process pool, instances and managers are then
+    created here, parents before children. Lazy models are left for later.
+    """
+    models = fk_ordered([m for m in pending_models if not m.Meta.lazy])
+
+    # computed once, it reads (and hashes) the whole fixture
+    headers = {
+        model: DjamixModelMeta.fixture_header(model.Meta, model)
+        for model in models
+        if model.Meta.cache or model.Meta.storage == 'mmap'
+    }
+    to_parse = [
+        model for model in models
+        if model not in headers or not DjamixModelMeta.has_fresh_cache(
+            model.Meta, model, headers[model]
+        )
+    ]
+
+    workers = workers or FIXTURE_WORKERS or os.cpu_count()
+    parsed = {}
+    # workers are forked – spawned ones would run the main script again
+    if len(to_parse) > 1 and workers > 1 and \
+            'fork' in multiprocessing.get_all_start_methods():
+        with ProcessPoolExecutor(
+            min(workers, len(to_parse)),
+            mp_context=multiprocessing.get_context('fork')
+        ) as pool:
+            futures = {
+                model: pool.submit(parse_fixture, model.Meta.fixture,
+                                   model.Meta.delimiter)
+                for model in to_parse
+            }
+            parsed = {model: f.result() for model, f in futures.items()}
+
+    for model in models:
+        # could've been loaded already, eg. by using it
+        if model in pending_models:
+            DjamixModelMeta.load_pending(
+                model, parsed.get(model), headers.get(model)
+            )
 
 
 def print_model_summary(name, cls):
@@ -602,13 +2980,34 @@ class DjamixModel(metaclass=DjamixModelMeta):
                 f"Your new seqid should be bigger than {seqid}"
             self.__class__._id_sequence = itertools.count(self.id + 1)
 
-        if self.uuid is None:
+        if self.Meta.uuids == 'random' and self.uuid is None:
             self.uuid = str(uuid4())  # TBD
 
     @property
     def pk(self):
         return self.id
 
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        # managers drop indexes and caches built before the change, views
+        # their cached responses
+        type(self)._record_version += 1
+        records_changed()
+
+    def __eq__(self, other):
+        # row proxies of columnar models are created on every access, they're
+        # the same record if they point to the same row
+        row = self.__dict__.get('_row')
+        if row is None:
+            return self is other
+        return type(other) is type(self) and other.__dict__.get('_row') == row
+
+    def __hash__(self):
+        row = self.__dict__.get('_row')
+        if row is None:
+            return object.__hash__(self)
+        return hash((type(self), row))
+
     def __repr__(self):
         return "<%s: %s>" % (self.__class__.__name__, self.uuid)
 
@@ -638,30 +3037,41 @@ class DjamixModel(metaclass=DjamixModelMeta):
 
     def set_attribute_with_accessible_name(self, key, value):
         # this is useful for CSVs that have columns with spaces, etc.
+        accessible_name, value = self.convert_value(key, value)
+        setattr(self, accessible_name, value)
+
+    @classmethod
+    def column_plan(cls, key, value):
+        """
+        Returns (accessible name, schema type, extractor) for a field, adding
+        it to the schema (as type of value) if it's not there yet.
+        """
         accessible_name = make_accessible_name(key)
-        schema = self.__class__._schema
+        schema = cls._schema
 
-        if accessible_name in schema:
-            typedef = schema[accessible_name]
-            if isinstance(typedef, Field):
-                desired_type = typedef.type
-                extractor = typedef.extractor
-            else:
-                desired_type = extractor = typedef
+        if accessible_name not in schema:
+            schema[accessible_name] = type(value)
 
-            # This is ugly on purpose. We don't want to use isinstance because
-            # we want the exact type, not including the subclasses
-            # (for example we want exactly datetime, not just date)
-            if type(value) != desired_type:  # NOQA
-                value = extractor(value)
+        typedef = schema[accessible_name]
+        if isinstance(typedef, Field):
+            return accessible_name, typedef.type, typedef.extractor
+        return accessible_name, typedef, typedef
 
-        else:
-            schema[accessible_name] = type(value)
+    @classmethod
+    def convert_value(cls, key, value):
+        """
+        Returns (accessible name, value converted to the schema type), adding
+        the field to the schema if it's not there yet.
+        """
+        accessible_name, desired_type, extractor = cls.column_plan(key, value)
 
-        # not sure if we even need this step...
-        self.__class__._schema = schema
+        # This is ugly on purpose. We don't want to use isinstance because
+        # we want the exact type, not including the subclasses
+        # (for example we want exactly datetime, not just date)
+        if type(value) != desired_type:  # NOQA
+            value = extractor(value)
 
-        setattr(self, accessible_name, value)
+        return accessible_name, value
 
 
 class DjamixCompositeModelMeta(type):
@@ -864,6 +3274,147 @@ def extract_taggable_from_locals(defined_locals):
     return output
 
 
+class LayeredContext(RequestContext):
+    """
+    RequestContext with layers (maps of a ChainMap) on top of it, the first
+    one gets template's modifications, the rest – shared between requests –
+    are only read.
+    """
+
+    def __init__(self, request, layers, **kwargs):
+        super().__init__(request, **kwargs)
+        self.layers = layers
+        self.dicts.extend(reversed(layers))
+
+    def set_upward(self, key, value):
+        # like Context.set_upward, but instead of a shared layer holding the
+        # key (eg. {% cycle ... as var %}) it writes to the first one
+        context = self.dicts[-1]
+        for d in reversed(self.dicts):
+            if key in d:
+                context = d
+                break
+        if any(context is layer for layer in self.layers[1:]):
+            context = self.layers[0]
+        context[key] = value
+
+
+class LayeredTemplateResponse(TemplateResponse):
+    """
+    TemplateResponse with a ChainMap as context_data. Its maps are layered on
+    the template context as they are instead of being copied into it (like
+    dicts passed to TemplateResponse are), so shared ones – global_context –
+    cost nothing per request.
+    """
+
+    @property
+    def rendered_content(self):
+        template = self.resolve_template(self.template_name)
+        context = LayeredContext(
+            self._request, self.context_data.maps,
+            autoescape=template.backend.engine.autoescape
+        )
+        return template.template.render(context)
+
+
+class ViewCache:
+    """
+    In-process LRU of responses rendered by a view. Entries expire after
+    timeout seconds or when any records change (see records_changed).
+    """
+
+    def __init__(self, timeout, max_entries=None, max_bytes=None):
+        self.timeout = timeout
+        self.max_entries = max_entries or VIEW_CACHE_ENTRIES
+        self.max_bytes = max_bytes or VIEW_CACHE_MAX_BYTES
+        self.entries = OrderedDict()
+        self.size = 0
+        # runserver handles requests in threads
+        self.lock = threading.Lock()
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[3])
+
+    def get(self, key):
+        """
+        (expires, data version, etag, content, content type) or None
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            if entry[0] < time.monotonic() or entry[1] != data_version:
+                self._remove(key)
+                return None
+
+            self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, content, content_type, version):
+        if len(content) > self.max_bytes:
+            return None
+
+        etag = '"%s"' % hashlib.blake2b(content, digest_size=16).hexdigest()
+        entry = (time.monotonic() + self.timeout, version, etag, content,
+                 content_type)
+
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = entry
+            self.size += len(content)
+
+            while len(self.entries) > self.max_entries or \
+                    self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+        return entry
+
+
+def cached_view(view, cache):
+    """
+    Wraps a template view with a ViewCache – successful GET and HEAD
+    responses are kept per url kwargs and querystring, and served with ETags
+    (or as 304 Not Modified if the client has them already).
+    """
+
+    def cached(request, **kwargs):
+        if request.method not in ['GET', 'HEAD']:
+            return view(request, **kwargs)
+
+        key = (
+            tuple(sorted(kwargs.items())),
+            tuple((k, tuple(v)) for k, v in sorted(request.GET.lists())),
+        )
+        response = None
+        entry = cache.get(key)
+        if entry is None:
+            version = data_version
+            response = view(request, **kwargs).render()
+            if response.status_code != 200:
+                return response
+
+            entry = cache.set(key, response.content, response['Content-Type'],
+                              version)
+            if entry is None:
+                return response
+
+        _, _, etag, content, content_type = entry
+        etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if etag in etags or '*' in etags:
+            response = HttpResponseNotModified()
+        elif response is None:
+            response = HttpResponse(content, content_type=content_type)
+
+        response['ETag'] = etag
+        return response
+
+    cached.cache = cache
+    return cached
+
+
 def create_views_from_description(descriptions, global_context):
     """
     Takes list of dictionaries with descriptions and global context,
@@ -886,10 +3437,13 @@ def create_views_from_description(descriptions, global_context):
         def make_function(v=v):
 
             def view(request, **kwargs):
-                context = dict(global_context, **kwargs)
-                context['querystring'] = dict(request.GET.items())
-                return TemplateResponse(request, v['template'], context)
+                context = dict(kwargs, querystring=dict(request.GET.items()))
+                return LayeredTemplateResponse(
+                    request, v['template'], ChainMap(context, global_context)
+                )
 
+            if v.get('cache'):
+                return cached_view(view, ViewCache(v['cache']))
             return view
 
         function = make_function()
@@ -1023,6 +3577,7 @@ def _setup_taggables(defined_locals, djamix_models):
         )
 
     USER_COMMANDS['shell'] = shell_command(defined_locals)
+    USER_COMMANDS['export_fake'] = export_fake
 
     register.simple_tag(media_url)
     register.simple_tag(async_include)
@@ -1038,7 +3593,7 @@ def describe_urls(urls):
 
     elif isinstance(urls, str):
         with open(urls, 'r') as opened_urls_file:
-            output = yaml.load(opened_urls_file)
+            output = yaml.load(opened_urls_file, Loader=SafeYAMLLoader)
 
         # autoreload when urls are changed
         autoreload._cached_filenames.append(urls)
@@ -1079,6 +3634,7 @@ def start(urls=None, **settings_kwargs):
     urls = urls or defined_locals.get('urls', None)
     urls = describe_urls(urls)
 
+    load_pending_fixtures()
     _setup_settings(**settings_kwargs)
     _setup_views_and_urlpatterns(global_context, defined_locals, urls)
     _setup_taggables(defined_locals, djamix_models)
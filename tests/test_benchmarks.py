@@ -0,0 +1,72 @@
+# coding: utf-8
+
+"""
+Benchmarks, skipped by default – run them with
+
+    DJAMIX_BENCHMARK=1 pytest tests/test_benchmarks.py -s
+
+DJAMIX_BENCHMARK_ROWS changes the size of generated fixtures (100k rows by
+default).
+"""
+
+from datetime import date, timedelta
+from io import StringIO
+import os
+import time
+
+from pytest import fixture, mark
+
+BENCHMARK_ROWS = int(os.environ.get('DJAMIX_BENCHMARK_ROWS', 100000))
+
+pytestmark = mark.skipif(
+    not os.environ.get('DJAMIX_BENCHMARK'),
+    reason="set DJAMIX_BENCHMARK=1 to run benchmarks"
+)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+@fixture(scope='module')
+def countries_yaml():
+    """Generated fixture in the same shape as tests/fixtures/countries.yaml"""
+    lines = ['---', '']
+    for i in range(BENCHMARK_ROWS):
+        lines += [
+            f'- name: Country {i}',
+            f'  iso: c{i}',
+            f'  currency: cur{i % 100}',
+            f'  location: LOC{i % 10}',
+            f'  random_date: {date(2000, 1, 1) + timedelta(days=i % 5000)}',
+            f'  continent: Continent {i % 7}',
+            f'  country_code: {i}',
+            '',
+        ]
+    return '\n'.join(lines)
+
+
+def test_yaml_loaders_benchmark(countries_yaml):
+    import yaml
+    from djamix import SafeYAMLLoader, iter_yaml_records
+
+    python_time, python_records = timed(
+        yaml.load, StringIO(countries_yaml), yaml.SafeLoader
+    )
+    fast_time, fast_records = timed(
+        yaml.load, StringIO(countries_yaml), SafeYAMLLoader
+    )
+    streaming_time, streaming_records = timed(
+        lambda s: list(iter_yaml_records(s)), StringIO(countries_yaml)
+    )
+
+    print(f"\n{BENCHMARK_ROWS} rows: SafeLoader {python_time:.2f}s, "
+          f"{SafeYAMLLoader.__name__} {fast_time:.2f}s, "
+          f"streaming {streaming_time:.2f}s")
+
+    assert python_records == fast_records == streaming_records
+    if yaml.__with_libyaml__:
+        assert fast_time < python_time
+        assert streaming_time < python_time
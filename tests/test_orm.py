@@ -354,3 +354,899 @@ def test_fake_records_generator(Country):
         assert isinstance(c, Country)
         assert c.id == c.pk == i
         assert UUID(c.uuid)
+
+
+def test_hash_indexes_for_equality_lookups():
+    from djamix import DjamixModel
+
+    class Country(DjamixModel):
+        class Meta:
+            fixture = 'tests/fixtures/countries.yaml'
+            indexes = ['iso']
+
+    # declared indexes are built upfront...
+    assert set(Country.objects._indexes) == {'iso'}
+    assert Country.objects.get(iso='pl').name == 'Poland'
+    assert Country.objects.filter(iso__exact='gb').count() == 1
+
+    # ... other schema fields get indexed on first lookup
+    assert Country.objects.filter(continent='Europe', name='UK').count() == 1
+    assert {'continent', 'name'} <= set(Country.objects._indexes)
+    assert Country.objects.filter(continent='Narnia').count() == 0
+
+    # derived managers only use declared indexes
+    europe = Country.objects.filter(continent='Europe')
+    assert europe.filter(name='Poland').count() == 1
+    assert set(europe._indexes) == set()
+
+    # adding records resets the indexes
+    Country.objects.precreate_fake(5)
+    assert Country.objects._indexes == {}
+    assert Country.objects.filter(iso='pl').count() >= 1
+    assert Country.objects.count() == 8
+
+
+def test_changing_records_resets_indexes(Country):
+    from pytest import importorskip
+
+    pl = Country.objects.get(iso='pl')
+    assert [n for n, _ in Country.objects.groupby('continent')] \
+        == ['Europe', 'Pangea']
+    pl.iso = 'xx'
+    pl.continent = 'Asia'
+    assert Country.objects.filter(iso='xx').count() == 1
+    assert Country.objects.filter(iso='pl').count() == 0
+    assert [n for n, _ in Country.objects.groupby('continent')] \
+        == ['Asia', 'Europe', 'Pangea']
+
+    importorskip('numpy')
+    assert Country.objects.filter(country_code__gt=47).get() is pl
+    pl.country_code = 1
+    assert Country.objects.filter(country_code__gt=47).count() == 0
+
+
+def test_fkeys_are_resolved_without_per_record_lookups(monkeypatch):
+    from djamix import DjamixModel, DjamixManager, FK
+
+    class Country(DjamixModel):
+        class Meta:
+            fixture = 'tests/fixtures/countries.yaml'
+
+    def fail(*args, **kwargs):
+        raise AssertionError("fk resolution shouldn't call .get()")
+
+    monkeypatch.setattr(DjamixManager, 'get', fail)
+
+    class City(DjamixModel):
+        country = FK(Country, 'country_iso', 'iso')
+
+        class Meta:
+            fixture = 'tests/fixtures/cities.yaml'
+
+    monkeypatch.undo()
+
+    assert City.objects.get(name='London').country.name == 'UK'
+    assert City.objects.get(name='Santo Subito').country is None
+
+    Country.objects.precreate_fake(1)
+    Country.objects._records[-1].iso = 'pl'
+
+    with raises(Country.MultipleObjectsReturned):
+        class City(DjamixModel):
+            country = FK(Country, 'country_iso', 'iso')
+
+            class Meta:
+                fixture = 'tests/fixtures/cities.yaml'
+
+
+def test_range_indexes():
+    from djamix import DjamixModel
+
+    class Country(DjamixModel):
+        class Meta:
+            fixture = 'tests/fixtures/countries.yaml'
+            range_indexes = ['country_code', 'random_date']
+
+    qs = Country.objects
+    assert qs._lookup_range_index('country_code', 'gt', 44) == [0, 2]
+    assert qs._lookup_range_index('name', 'gt', 'A') is None
+
+    assert qs.filter(country_code__gt=44).count() == 2
+    assert qs.filter(country_code__gte=44).count() == 3
+    assert qs.filter(country_code__lt=48).count() == 2
+    assert qs.filter(country_code__lte=46).count() == 2
+    assert qs.filter(country_code__range=(45, 47)).count() == 1
+    assert qs.filter(random_date__year=2000).count() == 2
+    assert qs.filter(random_date__month=10).count() == 1
+    assert [c.name for c in qs.filter(
+        random_date__range=(date(2000, 1, 1), date(2000, 12, 31))
+    )] == ['Poland', 'Narnia']
+    assert qs.filter(
+        random_date__gt=date(2000, 1, 1), continent='Europe'
+    ).get().name == 'UK'
+
+
+def test_orm_order_by_mixed_directions_and_cache(Country):
+    t1 = [c.name for c in Country.objects.order_by('continent', '-name')]
+    assert t1 == ['UK', 'Poland', 'Narnia']
+
+    t1 = [c.name for c in Country.objects.order_by('-random_date', 'name')]
+    assert t1 == ['UK', 'Narnia', 'Poland']
+
+    assert ('continent', '-name') in Country.objects._sort_cache
+    qs = Country.objects.order_by('continent', '-name')
+    qs._records.pop()
+    assert len(Country.objects.order_by('continent', '-name')) == 3
+
+    # renaming a record resets the cache
+    assert [c.name for c in Country.objects.order_by('name')] \
+        == ['Narnia', 'Poland', 'UK']
+    Country.objects.get(name='Poland').name = 'ZZZ'
+    assert [c.name for c in Country.objects.order_by('name')] \
+        == ['Narnia', 'UK', 'ZZZ']
+
+
+def test_lazy_managers(Country, monkeypatch):
+    import djamix.djamix
+
+    qs = Country.objects.filter(continent='Europe')\
+        .filter(country_code__gte=44)\
+        .order_by('-country_code')
+    assert qs._result_cache is None
+    assert len(qs._lookups) == 2
+    assert qs._source is Country.objects
+
+    # counting doesn't need sorting
+    assert qs.count() == 2
+    assert qs._result_cache is None
+
+    def no_full_sort(*args):
+        raise AssertionError("[:k] shouldn't sort everything")
+
+    monkeypatch.setattr(djamix.djamix, 'multi_attr_sort', no_full_sort)
+    assert [c.name for c in qs[:1]] == ['Poland']
+    assert qs[1].name == 'UK'
+    assert [c.name for c in
+            Country.objects.order_by('-continent', 'name')[:2]] \
+        == ['Narnia', 'Poland']
+    monkeypatch.undo()
+
+    assert [c.name for c in qs] == ['Poland', 'UK']
+    assert qs._result_cache is not None
+
+    # later order_by has priority, the previous one breaks the ties
+    t1 = [c.name for c in Country.objects.order_by('-name')
+          .order_by('continent')]
+    assert t1 == ['UK', 'Poland', 'Narnia']
+
+    with raises(ValueError):
+        Country.objects.filter(name__foo='bar')
+
+
+def test_compiled_lookups(Country):
+    from djamix import compile_lookups
+
+    predicate = compile_lookups(Country, [
+        ('uppercase_name', None, 'POLAND'),
+        ('continent', 'startswith', 'Eu'),
+        ('country_code', 'gte', 44),
+    ])
+    assert [c.name for c in Country.objects.all() if predicate(c)] \
+        == ['Poland']
+
+    # model methods are still called, schema fields are read directly
+    assert Country.objects.filter(uppercase_name__startswith='U').count() == 1
+    assert Country.objects.filter(name__icontains='LAN').count() == 1
+
+    # indexed lookup is not checked twice, the rest are
+    assert Country.objects.filter(
+        continent='Europe', country_code__lt=48
+    ).get().name == 'UK'
+
+
+def test_custom_filter_functions(Country, monkeypatch):
+    from djamix import FILTER_FUNCTIONS
+
+    monkeypatch.setitem(FILTER_FUNCTIONS, 'odd', lambda x, y: x % 2 == y)
+    assert Country.objects.filter(
+        continent='Europe', country_code__odd=0
+    ).count() == 2
+
+
+def test_chained_lookups_across_fkeys():
+    from djamix import DjamixModel, FK
+
+    class Country(DjamixModel):
+        class Meta:
+            fixture = 'tests/fixtures/countries.yaml'
+
+    class Town(DjamixModel):
+        country = FK(Country)
+
+        class Meta:
+            fixture = 'tests/fixtures/towns.yaml'
+
+    class District(DjamixModel):
+        town = FK(Town)
+
+        class Meta:
+            fixture = 'tests/fixtures/districts.yaml'
+
+    assert Town.objects.get(country__iso='pl').name == 'Krakow'
+    assert Town.objects.filter(country__name__icontains='u').count() == 1
+    assert Town.objects.filter(country__continent='Narnia').count() == 0
+
+    assert [d.name for d in District.objects.filter(town__country__iso='gb')]\
+        == ['Westminster', 'Camden']
+    assert District.objects.filter(
+        town__country__random_date__year=2000, name__startswith='K'
+    ).get().name == 'Kazimierz'
+
+    # and can be combined with filter() chains
+    qs = District.objects.filter(name__contains='e')
+    assert qs.filter(town__name='London').count() == 2
+
+    with raises(ValueError):
+        District.objects.filter(town__country__iso__foo='pl')
+
+    with raises(NotImplementedError):
+        District.objects.filter(name__year__gte=2018)
+
+
+def test_q_objects_exclude_and_in_lookups(Country):
+    from djamix import Q
+
+    def names(qs):
+        return [c.name for c in qs]
+
+    assert names(Country.objects.filter(iso__in=['pl', 'nn', 'xx'])) \
+        == ['Poland', 'Narnia']
+    assert names(Country.objects.filter(country_code__in={44})) == ['UK']
+    assert names(Country.objects.exclude(continent='Europe')) == ['Narnia']
+    assert names(Country.objects.exclude(
+        continent='Europe', country_code__gt=46
+    )) == ['UK', 'Narnia']
+
+    assert names(Country.objects.filter(Q(iso='pl') | Q(iso='gb'))) \
+        == ['Poland', 'UK']
+    assert names(Country.objects.filter(
+        Q(iso='pl') | Q(name__endswith='ia')
+    )) == ['Poland', 'Narnia']
+    assert names(Country.objects.filter(
+        ~Q(iso='pl') & Q(continent='Europe')
+    )) == ['UK']
+    assert names(Country.objects.filter(
+        Q(country_code__lt=46) | ~Q(uppercase_name__startswith='P'),
+        continent='Europe',
+    )) == ['UK']
+    assert Country.objects.get(Q(iso='nn'), continent='Pangea').name \
+        == 'Narnia'
+
+    # answered with the indexes only
+    qs = Country.objects
+    assert qs._lookup_positions(
+        qs._parse_q(Q(iso='pl') | ~Q(continent='Europe'))
+    ) == {0, 2}
+    assert qs._lookup_positions(qs._parse_q(Q(name__contains='a'))) is None
+
+
+def test_aggregates(Country):
+    from djamix import Sum, Count, Avg, Min, Max
+
+    assert Country.objects.aggregate(
+        Sum('country_code'), Min('random_date'), Max('name'),
+        avg=Avg('country_code'), total=Count('id'),
+    ) == {
+        'country_code__sum': 138,
+        'random_date__min': date(2000, 1, 1),
+        'name__max': 'UK',
+        'avg': 46,
+        'total': 3,
+    }
+
+    assert Country.objects.filter(name='San Escobar').aggregate(
+        Sum('country_code'), Count('id')
+    ) == {'country_code__sum': None, 'id__count': 0}
+
+    assert Country.objects.values('continent').annotate(
+        Max('country_code'), n=Count('id')
+    ) == [
+        {'continent': 'Europe', 'country_code__max': 48, 'n': 2},
+        {'continent': 'Pangea', 'country_code__max': 46, 'n': 1},
+    ]
+
+    values = Country.objects.order_by('name').values('name', 'uppercase_name')
+    assert len(values) == 3
+    assert values[0] == {'name': 'Narnia', 'uppercase_name': 'NARNIA'}
+
+
+def test_orm_hashed_groupby(Country):
+    qs = Country.objects.groupby(lambda c: c.random_date.year, hashed=True)
+    assert [(year, len(group)) for year, group in qs] == [(2000, 2), (2018, 1)]
+
+    qs = Country.objects.groupby('continent', hashed=True)
+    assert [(c, [x.name for x in group]) for c, group in qs] == [
+        ('Europe', ['Poland', 'UK']),
+        ('Pangea', ['Narnia']),
+    ]
+    assert Country.objects.groupby('continent', hashed=True) == qs
+    assert list(Country.objects._groupby_cache) == [('continent', True)]
+
+    Country.objects.precreate_fake(1)
+    assert Country.objects._groupby_cache == {}
+
+
+def test_columnar_storage():
+    from array import array
+    from djamix import DjamixModel, FK
+
+    class Country(DjamixModel):
+        class Meta:
+            fixture = 'tests/fixtures/countries.yaml'
+            storage = 'columnar'
+            ordering = ['-country_code']
+
+        def uppercase_name(self):
+            return self.name.upper()
+
+    assert isinstance(Country._columns['country_code'], array)
+    assert isinstance(Country._columns['id'], array)
+    assert isinstance(Country._columns['name'], list)
+    assert [c.name for c in Country.objects.all()] \
+        == ['Poland', 'Narnia', 'UK']
+
+    pl = Country.objects.get(iso='pl')
+    assert isinstance(pl, Country)
+    assert pl.pk == 1 and pl.random_date == date(2000, 1, 1)
+    assert pl.uppercase_name() == 'POLAND'
+    assert pl.to_dict()['continent'] == 'Europe'
+    assert Country.objects.filter(country_code__lt=48)\
+        .order_by('name')[0].name == 'Narnia'
+
+    class Town(DjamixModel):
+        country = FK(Country)
+
+        class Meta:
+            fixture = 'tests/fixtures/towns.yaml'
+            storage = 'columnar'
+
+    assert Town.objects.get(name='London').country.name == 'UK'
+    assert Town.objects.get(country__iso='pl').name == 'Krakow'
+    assert Town.objects.get(name='Santo Subito').country is None
+
+    # row proxies of the same row are equal
+    assert Country.objects.get(iso='pl') == pl
+    assert pl in list(Country.objects.all())
+    assert pl != Country.objects.get(iso='gb')
+    assert len({c for c in Country.objects.all()} | {pl}) == 3
+    assert Town.objects.filter(country=pl).count() == 1
+    assert Town.objects.get(country=pl).name == 'Krakow'
+    assert [(c.iso, len(towns)) for c, towns in Town.objects.groupby(
+        'country', hashed=True) if c] == [('gb', 1), ('pl', 1)]
+
+    # writes go to the columns
+    pl.country_code = 4800000000000000000000
+    assert Country.objects.get(iso='pl').country_code \
+        == 4800000000000000000000
+
+    Country.objects.precreate_fake(2)
+    assert Country.objects.count() == 5
+    assert Country.objects.get(pk=5).pk == 5
+
+
+def test_numpy_backend(Country, monkeypatch):
+    from pytest import importorskip
+    importorskip('numpy')
+    import djamix.djamix
+    from djamix import Sum, Min, Avg
+
+    qs = Country.objects.filter(
+        country_code__gte=46, random_date__lt=date(2010, 1, 1)
+    )
+    assert [c.name for c in qs] == ['Poland', 'Narnia']
+    assert set(Country.objects._numpy_columns) \
+        == {'country_code', 'random_date'}
+
+    assert Country.objects.filter(random_date__month=2).get().name \
+        == 'Narnia'
+    assert Country.objects.filter(country_code__in=[44, 46]).count() == 2
+    # name isn't numeric, so it's checked with python
+    assert Country.objects.filter(
+        country_code__range=(40, 50), name__startswith='U'
+    ).get().name == 'UK'
+
+    assert qs.sum('country_code') == {'country_code': 94}
+    assert qs.aggregate(Sum('country_code'), Avg('country_code'),
+                        Min('random_date'), Min('name')) == {
+        'country_code__sum': 94,
+        'country_code__avg': 47,
+        'random_date__min': date(2000, 1, 1),
+        'name__min': 'Narnia',
+    }
+
+    # same results without numpy
+    monkeypatch.setattr(djamix.djamix, 'numpy', None)
+    Country.objects._invalidate_caches()
+    qs = Country.objects.filter(
+        country_code__gte=46, random_date__lt=date(2010, 1, 1)
+    )
+    assert qs.sum('country_code') == {'country_code': 94}
+    assert Country.objects._numpy_columns == {}
+
+
+def test_numpy_backend_keeps_floats_in_int_fields(Country):
+    from pytest import approx, importorskip
+    importorskip('numpy')
+    from djamix.djamix import UNINDEXABLE
+
+    Country.objects.get(iso='gb').country_code = 44.7
+    assert Country.objects.filter(country_code__gt=44.5).count() == 3
+    assert Country.objects.filter(country_code__lt=44.8).get().iso == 'gb'
+    assert Country.objects.sum('country_code') \
+        == {'country_code': approx(138.7)}
+    assert Country.objects._numpy_columns['country_code'] is UNINDEXABLE
+
+
+def test_streaming_fixture_records():
+    from io import StringIO
+    from djamix import DjamixModel, iter_yaml_records
+
+    stream = StringIO("- name: Poland\n- name: UK\n- [broken\n")
+    records = iter_yaml_records(stream)
+    # records are parsed one by one, before the broken one is reached
+    assert next(records) == {'name': 'Poland'}
+    assert next(records) == {'name': 'UK'}
+    with raises(Exception):
+        next(records)
+
+    assert list(iter_yaml_records(StringIO("---\n"))) == []
+    assert list(iter_yaml_records(StringIO("- &a {x: 1}\n- *a\n"))) \
+        == [{'x': 1}, {'x': 1}]
+
+    class CSVCountry(DjamixModel):
+        class Meta:
+            fixture = 'tests/fixtures/countries.csv'
+            delimiter = ','
+
+    assert CSVCountry.objects.get(iso='gb').country_code == '44'
+
+
+def test_fixture_cache(tmp_path, monkeypatch):
+    import shutil
+    import djamix.djamix
+    from djamix import DjamixModel, DjamixModelMeta, Field
+
+    fixture_path = str(tmp_path / 'countries.yaml')
+    cache = tmp_path / 'countries.yaml.djamixcache'
+    shutil.copy('tests/fixtures/countries.yaml', fixture_path)
+
+    def make_model(use_cache=True, extractor=str):
+        class CachedCountry(DjamixModel):
+            country_code = Field(str, extractor)
+
+            class Meta:
+                fixture = fixture_path
+                cache = use_cache
+
+        return CachedCountry
+
+    Country = make_model()
+    assert cache.exists()
+    assert Country.objects.get(iso='pl').country_code == '48'
+
+    def fail(*args):
+        raise AssertionError("fixture shouldn't be parsed")
+
+    # unchanged fixture – records and inferred schema come from the cache
+    with monkeypatch.context() as m:
+        m.setattr(DjamixModelMeta, 'iter_records_file', fail)
+        Cached = make_model()
+    assert [(k, str(v)) for k, v in Cached._schema.items()] == \
+        [(k, str(v)) for k, v in Country._schema.items()]
+    assert Cached.objects.get(iso='pl').country_code == '48'
+    assert Cached.objects.get(iso='pl').random_date == \
+        Country.objects.get(iso='pl').random_date
+
+    # so does an extractor with changed code, even if its name is the same
+    assert make_model(extractor=lambda v: f'+{v}').objects\
+        .get(iso='pl').country_code == '+48'
+    assert make_model(extractor=lambda v: f'00{v}').objects\
+        .get(iso='pl').country_code == '0048'
+
+    # changed fixture invalidates the cache
+    with open(fixture_path, 'a') as fd:
+        fd.write('\n- name: Narnia\n  iso: nn\n')
+    assert make_model().objects.count() == 4
+
+    # and a corrupted one is just rebuilt
+    cache.write_bytes(b'garbage')
+    assert make_model().objects.count() == 4
+
+    # records are written in chunks while instances are created
+    monkeypatch.setattr(djamix.djamix, 'FIXTURE_CACHE_CHUNK', 3)
+    cache.unlink()
+    assert make_model().objects.count() == 4
+    with monkeypatch.context() as m:
+        m.setattr(DjamixModelMeta, 'iter_records_file', fail)
+        assert [c.name for c in make_model().objects.all()][-1] == 'Narnia'
+    assert not list(tmp_path.glob('*.tmp'))
+
+    # caches are opt-in
+    cache.unlink()
+    assert make_model(use_cache=None).objects.count() == 4
+    assert make_model(use_cache=False).objects.count() == 4
+    assert not cache.exists()
+    monkeypatch.setattr(djamix.djamix, 'FIXTURE_CACHE', True)
+    assert make_model(use_cache=None).objects.count() == 4
+    assert cache.exists()
+
+
+def test_mmap_storage(tmp_path):
+    import shutil
+    from djamix import DjamixModel, FK, StringColumn
+
+    for name in ['countries.yaml', 'towns.yaml']:
+        shutil.copy(f'tests/fixtures/{name}', tmp_path / name)
+
+    def make_models():
+        class Country(DjamixModel):
+            class Meta:
+                fixture = str(tmp_path / 'countries.yaml')
+                storage = 'mmap'
+                cache = False
+
+        class Town(DjamixModel):
+            country = FK(Country)
+
+            class Meta:
+                fixture = str(tmp_path / 'towns.yaml')
+                storage = 'mmap'
+                cache = False
+
+        return Country, Town
+
+    Country, Town = make_models()
+    assert (tmp_path / 'countries.yaml.djamixstore').exists()
+    assert isinstance(Country._columns['country_code'], memoryview)
+    assert isinstance(Country._columns['name'], StringColumn)
+
+    # second "worker" attaches to the same store
+    Country2, Town2 = make_models()
+    assert Country2.objects.count() == 3
+    pl = Country2.objects.get(iso='pl')
+    assert pl.pk == 1 and pl.uuid == Country.objects.get(iso='pl').uuid
+    assert pl.random_date == date(2000, 1, 1)
+    assert pl.to_dict()['continent'] == 'Europe'
+    assert Country2.objects.filter(country_code__lt=48)\
+        .order_by('name')[0].name == 'Narnia'
+    assert Town2.objects.get(name='London').country.name == 'UK'
+    assert Town2.objects.get(country__iso='pl').name == 'Krakow'
+    assert Town2.objects.get(name='Santo Subito').country is None
+    assert Town2.objects.filter(country=pl).count() == 1
+
+    # writes and new rows copy the column, the store stays as it was
+    pl.country_code = 4800
+    assert Country2.objects.get(iso='pl').country_code == 4800
+    assert isinstance(Country2._columns['country_code'], list)
+    Country2.objects.precreate_fake(2)
+    assert Country2.objects.count() == 5
+    assert Country2.objects.get(pk=5).pk == 5
+    assert make_models()[0].objects.get(iso='pl').country_code == 48
+
+
+def test_json_fixtures(tmp_path):
+    from io import StringIO
+    from djamix import DjamixModel, Field, FixtureError, \
+        iter_json_lines_records
+
+    class JSONCountry(DjamixModel):
+        class Meta:
+            fixture = 'tests/fixtures/countries.json'
+
+    assert JSONCountry.objects.get(iso='gb').country_code == 44
+
+    class JSONLinesCountry(DjamixModel):
+        random_date = Field(date, lambda v: date.fromisoformat(v))
+
+        class Meta:
+            fixture = 'tests/fixtures/countries.jsonl'
+
+    assert JSONLinesCountry.objects.count() == 3
+    assert JSONLinesCountry.objects.get(iso='pl').random_date \
+        == date(2000, 1, 1)
+
+    # lines are parsed one by one
+    records = iter_json_lines_records(StringIO('{"a": 1}\n{"a": \n'), 'x')
+    assert next(records) == {'a': 1}
+    with raises(FixtureError, match='x:2'):
+        next(records)
+
+    with raises(FixtureError):
+        list(iter_json_lines_records(StringIO('[1, 2]\n')))
+
+    fixture = tmp_path / 'broken.json'
+    fixture.write_text('{"name": "Poland"}')
+    with raises(FixtureError):
+        class BrokenCountry(DjamixModel):
+            class Meta:
+                fixture = str(tmp_path / 'broken.json')
+
+
+def test_parallel_fixture_loading(monkeypatch):
+    import djamix.djamix
+    from djamix import DjamixModel, FK, load_pending_fixtures, pending_models
+
+    monkeypatch.setattr(djamix.djamix, 'FIXTURE_WORKERS', 2)
+
+    class Country(DjamixModel):
+        class Meta:
+            fixture = 'tests/fixtures/countries.yaml'
+            cache = False
+
+    class Town(DjamixModel):
+        country = FK(Country)
+
+        class Meta:
+            fixture = 'tests/fixtures/towns.yaml'
+            cache = False
+
+    class District(DjamixModel):
+        town = FK(Town)
+
+        class Meta:
+            fixture = 'tests/fixtures/districts.yaml'
+            cache = False
+
+    # nothing is loaded until start() (or until it's needed)
+    assert 'objects' not in Town.__dict__
+    assert list(pending_models) == [Country, Town, District]
+
+    load_pending_fixtures()
+    assert not pending_models
+    assert Town.objects.get(name='London').country.name == 'UK'
+    assert District.objects.get(name='Kazimierz').town.country.iso == 'pl'
+
+    class LazyCountry(DjamixModel):
+        class Meta:
+            fixture = 'tests/fixtures/countries.yaml'
+
+    assert LazyCountry in pending_models
+    assert LazyCountry.objects.count() == 3
+    assert LazyCountry not in pending_models
+    with raises(AttributeError):
+        LazyCountry.not_there
+
+
+def test_fixture_source_is_read_once(tmp_path, monkeypatch):
+    import shutil
+    import djamix.djamix
+    from djamix import DjamixModel, load_pending_fixtures
+
+    fixture_path = str(tmp_path / 'countries.yaml')
+    shutil.copy('tests/fixtures/countries.yaml', fixture_path)
+
+    sources = []
+    original = djamix.djamix.DjamixModelMeta.fixture_source
+
+    def fixture_source(filename):
+        sources.append(filename)
+        return original(filename)
+
+    monkeypatch.setattr(
+        djamix.djamix.DjamixModelMeta, 'fixture_source',
+        staticmethod(fixture_source)
+    )
+
+    for storage_type in ['objects', 'mmap']:
+        sources.clear()
+
+        class CachedCountry(DjamixModel):
+            class Meta:
+                fixture = fixture_path
+                cache = True
+                storage = storage_type
+
+        load_pending_fixtures()
+        assert CachedCountry.objects.get(iso='pl').name == 'Poland'
+        assert sources == [fixture_path]
+
+
+def test_lazy_fixture_loading(capsys):
+    from djamix import DjamixModel, FK, djamix_models, \
+        load_pending_fixtures, pending_models
+
+    class LazyCountry(DjamixModel):
+        class Meta:
+            fixture = 'tests/fixtures/countries.yaml'
+            lazy = True
+
+    class LazyTown(DjamixModel):
+        country = FK(LazyCountry)
+
+        class Meta:
+            fixture = 'tests/fixtures/towns.yaml'
+            lazy = True
+
+    assert djamix_models['LazyCountry'] is LazyCountry
+    load_pending_fixtures()  # what start() does – lazy ones are skipped
+    assert 'objects' not in LazyCountry.__dict__
+    assert 'Created LazyCountry' not in capsys.readouterr().out
+
+    # loading the town loads its country too
+    assert LazyTown.objects.get(name='London').country.name == 'UK'
+    assert LazyCountry not in pending_models
+    assert LazyTown not in pending_models
+    out = capsys.readouterr().out
+    assert 'Created LazyCountry' in out and '\tname -> str' in out
+
+
+def test_failed_lazy_load_is_retried(tmp_path):
+    from djamix import DjamixModel, FixtureError, pending_models
+
+    fixture_path = tmp_path / 'countries.json'
+    fixture_path.write_text('{"name": "Poland"}')
+
+    class LazyCountry(DjamixModel):
+        class Meta:
+            fixture = str(fixture_path)
+            lazy = True
+
+    for _ in range(2):
+        with raises(FixtureError):
+            LazyCountry.objects
+        assert LazyCountry in pending_models
+
+    fixture_path.write_text('[{"name": "Poland"}]')
+    assert LazyCountry.objects.get().name == 'Poland'
+    assert LazyCountry not in pending_models
+
+
+def test_column_plan_is_computed_once_per_fixture(monkeypatch):
+    import djamix.djamix
+    from djamix import DjamixModel, Field
+
+    calls = []
+    original = djamix.djamix.DjamixModel.column_plan.__func__
+
+    def column_plan(cls, key, value):
+        calls.append(key)
+        return original(cls, key, value)
+
+    monkeypatch.setattr(DjamixModel, 'column_plan', classmethod(column_plan))
+
+    class CSVCountry(DjamixModel):
+        country_code = Field(int)
+
+        class Meta:
+            fixture = 'tests/fixtures/countries.csv'
+            delimiter = ','
+            cache = False
+
+    assert sorted(calls) == ['Country Code', 'ISO', 'Name']
+    assert CSVCountry.objects.get(iso='gb').country_code == 44
+    assert CSVCountry._schema['name'] == str
+
+
+def test_derived_uuids_and_batch_ids():
+    from uuid import NAMESPACE_URL, uuid5
+    from djamix import DjamixModel, DjamixException
+
+    for storage_type in ['objects', 'columnar']:
+        class Country(DjamixModel):
+            class Meta:
+                fixture = 'tests/fixtures/countries.yaml'
+                storage = storage_type
+                uuids = 'derived'
+
+        assert Country.Meta.storage == storage_type
+        pl = Country.objects.get(iso='pl')
+        assert [c.pk for c in Country.objects.all()] == [1, 2, 3]
+        assert 'uuid' not in pl.__dict__
+        assert pl.uuid == str(uuid5(NAMESPACE_URL, 'Country/1'))
+        assert Country.objects.get(uuid=pl.uuid).iso == 'pl'
+
+        new = Country(name='Atlantis')
+        assert new.pk == 4 and UUID(new.uuid).version == 5
+
+    class RandomCountry(DjamixModel):
+        class Meta:
+            fixture = 'tests/fixtures/countries.yaml'
+
+    assert [c.pk for c in RandomCountry.objects.all()] == [1, 2, 3]
+    assert len({c.uuid for c in RandomCountry.objects.all()}) == 3
+    assert RandomCountry(name='Atlantis').pk == 4
+
+    with raises(DjamixException):
+        class BrokenCountry(DjamixModel):
+            class Meta:
+                uuids = 'sequential'
+
+
+def test_fake_records_are_reproducible(Country, monkeypatch):
+    import djamix.djamix
+    from djamix import DjamixModel, Field
+
+    def values(manager):
+        return [
+            {k: v for k, v in c.to_dict().items()
+             if k not in ['id', 'pk', 'uuid']}
+            for c in manager
+        ]
+
+    monkeypatch.setattr(djamix.djamix, 'FAKE_CHUNK_SIZE', 3)
+    fakes = Country.objects.fake(7, seed=42)
+    assert len(fakes) == 7
+    assert len({c.pk for c in fakes}) == 7
+    assert all(isinstance(c.country_code, int) for c in fakes)
+    assert all(isinstance(c.random_date, date) for c in fakes)
+    assert all(date(1970, 1, 1) <= c.random_date <= date(2029, 12, 31)
+               for c in fakes)
+
+    assert values(Country.objects.fake(7, seed=42)) == values(fakes)
+    assert values(Country.objects.fake(7, seed=42, workers=2)) \
+        == values(fakes)
+    assert values(Country.objects.fake(7, seed=43)) != values(fakes)
+
+    # declared fields' extractors (lambdas) don't have to go to the workers
+    class DatedCountry(DjamixModel):
+        random_date = Field(date, lambda v: v)
+
+        class Meta:
+            fixture = 'tests/fixtures/countries.yaml'
+
+    fakes = DatedCountry.objects.fake(7, seed=1)
+    assert all(isinstance(c.random_date, date) for c in fakes)
+    assert values(DatedCountry.objects.fake(7, seed=1, workers=2)) \
+        == values(fakes)
+
+    monkeypatch.setattr(djamix.djamix, 'numpy', None)
+    assert values(Country.objects.fake(4, seed=1)) \
+        == values(Country.objects.fake(4, seed=1))
+
+
+def test_export_fake_fixtures(Country, tmp_path, monkeypatch):
+    from djamix import DjamixModel, DjamixModelMeta, export_fake
+
+    def values(records, *fields):
+        return [tuple(getattr(r, f) for f in fields) for r in records]
+
+    fakes = Country.objects.fake(5, seed=7)
+    assert [c.uuid for c in fakes] \
+        == [c.uuid for c in Country.objects.fake(5, seed=7)]
+
+    filename = str(tmp_path / 'fake_countries.yaml')
+    fakes.export(filename, cache=True)
+    assert (tmp_path / 'fake_countries.yaml.djamixcache').exists()
+
+    with monkeypatch.context() as m:
+        def fail(*args):
+            raise AssertionError("fixture shouldn't be parsed")
+
+        m.setattr(DjamixModelMeta, 'iter_records_file', fail)
+
+        class FakeCountry(DjamixModel):
+            class Meta:
+                fixture = filename
+                cache = True
+
+    fields = ['name', 'iso', 'random_date', 'country_code']
+    assert values(FakeCountry.objects.all(), *fields) \
+        == values(fakes, *fields)
+
+    for extension in ['csv', 'jsonl']:
+        filename = str(tmp_path / f'fake_countries.{extension}')
+        fakes.export(filename)
+
+        class ExportedCountry(DjamixModel):
+            class Meta:
+                fixture = filename
+                delimiter = ','
+
+        assert values(ExportedCountry.objects.all(), 'name', 'iso') \
+            == values(fakes, 'name', 'iso')
+
+    filename = str(tmp_path / 'command.jsonl')
+    assert export_fake('Country', '3', filename, '7') \
+        == f"Exported 3 Country records to {filename}"
+    with open(filename) as fd:
+        assert len(fd.readlines()) == 3
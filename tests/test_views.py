@@ -60,3 +60,93 @@ def test_handling_custom_template_tags(client):
     start('tests/fixtures/paths1.yaml', CUSTOM_TEMPLATE_DIRS=template_paths)
     response = client.get(reverse('with_templatetags'))
     assert content(response) == "greeting == Hello world"
+
+
+def test_views_layer_global_context_without_copying(client):
+    template_paths = [rel('../tests/templates/')]
+    context = {'hello': 'world'}  # NOQA
+    start('tests/fixtures/paths1.yaml', CUSTOM_TEMPLATE_DIRS=template_paths)
+
+    first = client.get(reverse('with_variables'), {'hello': 'there'})
+    second = client.get(reverse('with_variables'))
+    assert content(first) == content(second) == "hello == world"
+
+    request_context, global_context = first.context_data.maps
+    assert request_context == {'querystring': {'hello': 'there'}}
+    assert global_context['hello'] == 'world'
+    assert second.context_data.maps[1] is global_context
+
+
+def test_views_dont_write_into_global_context(client):
+    template_paths = [rel('../tests/templates/')]
+    context = {'hello': 'world'}  # NOQA
+    start('tests/fixtures/paths1.yaml', CUSTOM_TEMPLATE_DIRS=template_paths)
+
+    first = client.get(reverse('with_cycle'))
+    second = client.get(reverse('with_cycle'))
+    assert content(first) == content(second) == "a a"
+
+    request_context, global_context = second.context_data.maps
+    assert request_context['hello'] == 'a'
+    assert global_context['hello'] == 'world'
+
+
+def test_cached_views(client, monkeypatch):
+    from django.urls import resolve
+    from djamix import DjamixModel, LayeredTemplateResponse
+
+    template_paths = [rel('../tests/templates/')]
+    context = {'hello': 'world'}  # NOQA
+    start('tests/fixtures/paths_cached.yaml',
+          CUSTOM_TEMPLATE_DIRS=template_paths)
+
+    renders = []
+    rendered_content = LayeredTemplateResponse.rendered_content
+
+    def counting(self):
+        renders.append(self)
+        return rendered_content.fget(self)
+
+    monkeypatch.setattr(LayeredTemplateResponse, 'rendered_content',
+                        property(counting))
+
+    url = reverse('cached', kwargs={'name': 'foo'})
+    response = client.get(url, {'q': 'bar'})
+    assert content(response) == "world foo bar"
+    etag = response['ETag']
+
+    response = client.get(url, {'q': 'bar'})
+    assert content(response) == "world foo bar"
+    assert response['ETag'] == etag
+    assert len(renders) == 1
+
+    response = client.get(url, {'q': 'bar'}, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert client.get(url, {'q': 'baz'})['ETag'] != etag
+    assert len(renders) == 2
+
+    # changing records invalidates cached responses
+    class CachedCountry(DjamixModel):
+        class Meta:
+            fixture = 'tests/fixtures/countries.yaml'
+
+    response = client.get(url, {'q': 'bar'}, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304  # rendered again, but the same
+    assert len(renders) == 3
+
+    CachedCountry.objects.precreate_fake(1)
+    client.get(url, {'q': 'bar'})
+    assert len(renders) == 4
+
+    CachedCountry.objects.get(iso='pl').name = 'Polska'
+    client.get(url, {'q': 'bar'})
+    assert len(renders) == 5
+
+    cache = resolve(url).func.cache
+    cache.max_entries = 1
+    client.get(reverse('cached', kwargs={'name': 'other'}))
+    assert list(cache.entries) == [((('name', 'other'),), ())]
+
+    # entries removed by another thread in the meantime are ignored
+    cache._remove(('missing',))
+    assert cache.size == len(cache.entries[((('name', 'other'),), ())][3])